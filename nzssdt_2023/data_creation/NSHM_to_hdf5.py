@@ -1,9 +1,11 @@
 """
 helper functions for producing an HDF5 file for the NZSSDT tables
 """
+import logging
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import TYPE_CHECKING, Any, Dict, List, Optional, Union
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
 
 import pandas as pd
 
@@ -11,6 +13,9 @@ from nzssdt_2023.data_creation import query_NSHM as q_haz
 from nzssdt_2023.data_creation.constants import (
     AGG_LIST,
     DEFAULT_RPS,
+    HDF5_COMPRESSION,
+    HDF5_FORMAT_VERSION,
+    HDF5_SITE_CHUNK_SIZE,
     IMT_LIST,
     IMTL_LIST,
     VS30_LIST,
@@ -19,9 +24,13 @@ from nzssdt_2023.data_creation.constants import (
 if TYPE_CHECKING:
     import numpy.typing as npt
 
+    from nzssdt_2023.data_creation.curve_cache import HazardCurveCache
+
 import h5py
 import numpy as np
 
+log = logging.getLogger(__name__)
+
 g = 9.80665  # gravity in m/s^2
 
 
@@ -87,10 +96,61 @@ def convert_imtls_to_disp(acc_imtls):
     return disp_imtls
 
 
+def interpolate_along_last_axis(
+    x: "npt.NDArray", xp: "npt.NDArray", fp: "npt.NDArray"
+) -> "npt.NDArray":
+    """Piecewise linear interpolation of many curves at once
+
+    This reproduces `np.interp` exactly (including its handling of values outside the domain and
+    of non-finite slopes), but for every curve stored along the last axis of `xp` and `fp`.
+
+    Args:
+        x:  the coordinates at which to evaluate the curves (1-D)
+        xp: the x-coordinates of the curves, non-decreasing along the last axis
+        fp: the y-coordinates of the curves, broadcastable to the shape of xp
+
+    Returns:
+        interpolated values with dimensions [*xp.shape[:-1], len(x)]
+    """
+    x = np.asarray(x, dtype=float)
+    xp = np.asarray(xp, dtype=float)
+    fp = np.broadcast_to(np.asarray(fp, dtype=float), xp.shape)
+    n_points = xp.shape[-1]
+
+    # index of the last xp <= x (equivalent to np.searchsorted(xp, x, side="right") - 1)
+    j = np.sum(xp[..., np.newaxis, :] <= x[:, np.newaxis], axis=-1) - 1
+    j_lo = np.clip(j, 0, n_points - 2)
+
+    x_lo = np.take_along_axis(xp, j_lo, axis=-1)
+    x_hi = np.take_along_axis(xp, j_lo + 1, axis=-1)
+    y_lo = np.take_along_axis(fp, j_lo, axis=-1)
+    y_hi = np.take_along_axis(fp, j_lo + 1, axis=-1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = (y_hi - y_lo) / (x_hi - x_lo)
+        result = slope * (x - x_lo) + y_lo
+
+        # if we get nan in one direction, try the other
+        retry = np.isnan(result)
+        result = np.where(retry, slope * (x - x_hi) + y_hi, result)
+    flat = np.isnan(result) & retry & (y_lo == y_hi)
+    result = np.where(flat, y_lo, result)
+
+    # avoid potential non-finite interpolation at the nodes
+    result = np.where(x_lo == x, y_lo, result)
+
+    # values at and beyond the end of the domain
+    result = np.where(j == n_points - 1, fp[..., -1:], result)
+    result = np.where(j < 0, fp[..., :1], result)
+
+    return result
+
+
 def calculate_hazard_design_intensities(
     data: Dict[str, Any],
     hazard_rps: Union[List[int], "npt.NDArray"],
     intensity_type="acc",
+    site_chunk_size: Optional[int] = None,
 ):
     """
     calculate design intensities based on an annual probability of exceedance (APoE)
@@ -102,43 +162,51 @@ def calculate_hazard_design_intensities(
 
     :param data: dictionary containing hazard curves and metadata for vs30, sites, intensity measures
     :param hazard_rps: list containing the desired return periods (1 / APoE)
+    :param intensity_type: "acc" or "disp"
+    :param site_chunk_size: number of sites to interpolate at once (default: all sites)
 
     :return: np arrays for all intensities from the hazard curve realizations and stats (mean and quantiles)
     """
 
     hazard_rps = np.array(hazard_rps)
     imtls = data["metadata"][f"{intensity_type}_imtls"]
-    hcurves_stats = np.array(data["hcurves"]["hcurves_stats"])
+    hcurves_stats = data["hcurves"]["hcurves_stats"]
+    if not hasattr(hcurves_stats, "shape"):
+        hcurves_stats = np.array(hcurves_stats)
 
     [n_vs30, n_sites, n_imts, _, n_stats] = hcurves_stats.shape
 
     n_rps = len(hazard_rps)
+    site_chunk_size = site_chunk_size or n_sites
 
     stats_im_hazard = np.zeros([n_vs30, n_sites, n_imts, n_rps, n_stats])
 
-    for i_vs30 in range(n_vs30):
-        for i_site in range(n_sites):
-            for i_imt, imt in enumerate(imtls.keys()):
-
-                # loop over the median and any quantiles
-                for i_stat in range(n_stats):
-                    # the interpolation is done as a linear interpolation in logspace
-                    # all inputs are converted to the natural log and the output is converted back via the exponent
-                    stats_im_hazard[i_vs30, i_site, i_imt, :, i_stat] = np.exp(
-                        np.interp(
-                            np.log(1 / hazard_rps),
-                            np.log(
-                                np.flip(hcurves_stats[i_vs30, i_site, i_imt, :, i_stat])
-                            ),
-                            np.log(np.flip(imtls[imt])),
-                        )
-                    )
+    # the interpolation is done as a linear interpolation in logspace
+    # all inputs are converted to the natural log and the output is converted back via the exponent
+    log_apoes = np.log(1 / hazard_rps)
+    with np.errstate(divide="ignore"):
+        log_imtls = np.log(np.flip(np.array([imtls[imt] for imt in imtls.keys()]), -1))
+
+    for start in range(0, n_sites, site_chunk_size):
+        stop = min(start + site_chunk_size, n_sites)
+
+        # dimensions: vs30, site, imt, stat, intensity level
+        hcurves = np.moveaxis(np.array(hcurves_stats[:, start:stop]), 3, -1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_hcurves = np.log(np.flip(hcurves, -1))
+
+        log_intensities = interpolate_along_last_axis(
+            log_apoes, log_hcurves, log_imtls[:, np.newaxis, :]
+        )
+        stats_im_hazard[:, start:stop] = np.moveaxis(np.exp(log_intensities), -1, 3)
+
     return stats_im_hazard
 
 
 def add_uniform_hazard_spectra(
     data: Dict[str, Any],
     hazard_rps: Optional[List[int]] = None,
+    site_chunk_size: Optional[int] = None,
 ) -> Dict[str, Any]:
     """
     Adds uniform hazard spectra to the data dictionary, based on the input hazard_rps
@@ -146,6 +214,7 @@ def add_uniform_hazard_spectra(
     Args:
         data: dictionary containing hazard curves and metadata for vs30, sites, intensity measures
         hazard_rps: list of return periods of interest (inverse of annual probability of exceedance, apoe)
+        site_chunk_size: number of sites to interpolate at once (default: all sites)
 
     Returns:
         updated dictionary includes design intensities
@@ -167,7 +236,9 @@ def add_uniform_hazard_spectra(
         data["hazard_design"][intensity_type] = {}
         data["hazard_design"][intensity_type][
             "stats_im_hazard"
-        ] = calculate_hazard_design_intensities(data, hazard_rps, intensity_type)
+        ] = calculate_hazard_design_intensities(
+            data, hazard_rps, intensity_type, site_chunk_size
+        )
 
     return data
 
@@ -208,31 +279,109 @@ def create_hcurve_dictionary(sites, vs30_list, imt_list, imtl_list, agg_list, hc
     return data
 
 
-def save_hdf(hf_name, data):
+def save_imtls(grp: "h5py.Group", name: str, imtls: Dict[str, List[float]]):
+    """
+    Saves the intensity levels as one numeric dataset per intensity measure.
+
+    The subgroup tracks creation order, so the intensity measures are read back in order.
+
+    :param grp: hdf5 group to add the imtls to
+    :param name: name of the imtls subgroup e.g., acc_imtls
+    :param imtls: keys: intensity measures e.g., SA(1.0), values: list of intensity levels
+    """
+    subgrp = grp.create_group(name, track_order=True)
+    for imt, levels in imtls.items():
+        subgrp.create_dataset(imt, data=np.array(levels, dtype=np.float64))
+
+
+def save_sites(grp: "h5py.Group", sites: pd.DataFrame):
+    """
+    Saves the sites as a compound dataset of strings, with the site names in the "site" field.
+
+    :param grp: hdf5 group to add the sites to
+    :param sites: pd dataframe  idx: sites, cols: ['latlon', 'lat', 'lon']
+    """
+    str_dtype = h5py.string_dtype()
+    fields = ["site"] + list(sites.columns)
+    records = np.empty(len(sites), dtype=[(field, str_dtype) for field in fields])
+    records["site"] = sites.index.astype(str)
+    for column in sites.columns:
+        records[column] = sites[column].astype(str)
+
+    grp.create_dataset("sites", data=records)
+
+
+def save_site_array(
+    grp: "h5py.Group",
+    name: str,
+    array: "npt.ArrayLike",
+    site_chunk_size: Optional[int] = HDF5_SITE_CHUNK_SIZE,
+    compression: Optional[str] = HDF5_COMPRESSION,
+):
+    """
+    Saves a hazard array (dimensions: vs30, site, ...) as a float32 dataset.
+
+    Each chunk holds all values for a block of sites, so reading a range of sites only
+    decompresses the chunks for those sites.
+
+    :param grp: hdf5 group to add the dataset to
+    :param name: name of the dataset
+    :param array: hazard array with sites on the second axis
+    :param site_chunk_size: number of sites per chunk, None for contiguous storage
+    :param compression: "gzip", "lzf" or None, compressed datasets also use the shuffle filter
+    """
+    array = np.asarray(array, dtype=np.float32)
+
+    chunks = None
+    if site_chunk_size:
+        n_sites = max(1, min(site_chunk_size, array.shape[1]))
+        chunks = array.shape[:1] + (n_sites,) + array.shape[2:]
+
+    grp.create_dataset(
+        name,
+        data=array,
+        chunks=chunks,
+        compression=compression,
+        shuffle=compression is not None,
+    )
+
+
+def save_hdf(
+    hf_name,
+    data,
+    site_chunk_size: Optional[int] = HDF5_SITE_CHUNK_SIZE,
+    compression: Optional[str] = HDF5_COMPRESSION,
+):
     """
     Saves the data dictionary as an hdf5 file for later use.
 
     :param hf_name: name of the hdf5 file
     :param data: dictionary containing hazard curves and metadata for
                      vs30, sites, intensity measures, and design intensities
+    :param site_chunk_size: number of sites per chunk of the hazard datasets
+    :param compression: compression filter of the hazard datasets ("gzip", "lzf" or None)
     """
     with h5py.File(hf_name, "w") as hf:
+        hf.attrs["format_version"] = HDF5_FORMAT_VERSION
 
         # add metadata
         grp = hf.create_group("metadata")
         grp.attrs["vs30s"] = data["metadata"]["vs30s"]
         grp.attrs["quantiles"] = data["metadata"]["quantiles"]
-        grp.attrs["acc_imtls"] = str(data["metadata"]["acc_imtls"])
-        grp.attrs["disp_imtls"] = str(data["metadata"]["disp_imtls"])
-        grp.attrs["sites"] = str(data["metadata"]["sites"].to_dict())
+        save_imtls(grp, "acc_imtls", data["metadata"]["acc_imtls"])
+        save_imtls(grp, "disp_imtls", data["metadata"]["disp_imtls"])
+        save_sites(grp, data["metadata"]["sites"])
 
         # add hazard curves
         grp = hf.create_group("hcurves")
         for dset_name in ["hcurves_stats"]:
-            dset = grp.create_dataset(
-                dset_name, np.array(data["hcurves"][dset_name]).shape
+            save_site_array(
+                grp,
+                dset_name,
+                data["hcurves"][dset_name],
+                site_chunk_size,
+                compression,
             )
-            dset[:] = np.array(data["hcurves"][dset_name])
 
         # add poe values
         if "hazard_design" in data.keys():
@@ -241,22 +390,178 @@ def save_hdf(hf_name, data):
             for intensity_type in ["acc", "disp"]:
                 subgrp = grp.create_group(intensity_type)
                 for dset_name in ["stats_im_hazard"]:
-                    dset = subgrp.create_dataset(
+                    save_site_array(
+                        subgrp,
                         dset_name,
-                        np.array(
-                            data["hazard_design"][intensity_type][dset_name]
-                        ).shape,
+                        data["hazard_design"][intensity_type][dset_name],
+                        site_chunk_size,
+                        compression,
                     )
-                    dset[:] = np.array(data["hazard_design"][intensity_type][dset_name])
 
     print(f"\nHazard curve data is saved as {hf_name}")
 
 
+def checkpoint_filepath(hf_name: Union[str, Path]) -> Path:
+    """
+    The checkpoint file used while the hazard curves for `hf_name` are retrieved in batches.
+
+    :param hf_name: name of the hdf5 file
+    :return: name of the checkpoint hdf5 file
+    """
+    hf_name = Path(hf_name)
+    return hf_name.with_name(f"{hf_name.stem}.checkpoint{hf_name.suffix}")
+
+
+def _checkpoint_matches(
+    hf: h5py.File,
+    sites: pd.DataFrame,
+    vs30_list: List[int],
+    imt_list: List[str],
+    agg_list: List[str],
+    hazard_id: str,
+    batch_size: int,
+) -> bool:
+    """True if the checkpoint was written for the same query and batches"""
+    if "batch_done" not in hf:
+        return False
+    return (
+        hf.attrs["hazard_id"] == hazard_id
+        and int(hf.attrs["batch_size"]) == batch_size
+        and list(hf.attrs["vs30s"]) == list(vs30_list)
+        and list(hf.attrs["imts"]) == list(imt_list)
+        and list(hf.attrs["aggs"]) == list(agg_list)
+        and hf["latlon"].asstr()[:].tolist() == list(sites["latlon"])
+    )
+
+
+def _reset_checkpoint(
+    hf: h5py.File,
+    sites: pd.DataFrame,
+    vs30_list: List[int],
+    imt_list: List[str],
+    agg_list: List[str],
+    hazard_id: str,
+    batch_size: int,
+    n_batches: int,
+):
+    """Clear the checkpoint and record the query and batches it is written for"""
+    for name in list(hf.keys()):
+        del hf[name]
+    hf.attrs.clear()
+
+    hf.attrs["hazard_id"] = hazard_id
+    hf.attrs["batch_size"] = batch_size
+    hf.attrs["vs30s"] = vs30_list
+    hf.attrs["imts"] = imt_list
+    hf.attrs["aggs"] = agg_list
+    hf.create_dataset("latlon", data=list(sites["latlon"]), dtype=h5py.string_dtype())
+    hf.create_dataset("batch_done", data=np.zeros(n_batches, dtype=bool))
+
+
+def retrieve_hazard_curves_in_batches(
+    checkpoint_file: Union[str, Path],
+    sites: pd.DataFrame,
+    vs30_list: List[int],
+    imt_list: List[str],
+    agg_list: List[str],
+    hazard_id: str,
+    batch_size: int,
+    workers: int = 1,
+    cache: Optional["HazardCurveCache"] = None,
+) -> Tuple["npt.NDArray", List[float]]:
+    """
+    Retrieves the hazard curves in batches of sites, checkpointing each batch to an hdf5.
+
+    The batches are queried concurrently in a pool of threads. Every completed batch is
+    written to the checkpoint file, so if the retrieval is interrupted, calling this again
+    with the same arguments only queries the batches that are not in the checkpoint yet.
+
+    :param checkpoint_file: name of the checkpoint hdf5 file
+    :param sites: pd dataframe  idx: sites, cols: ['latlon', 'lat', 'lon']
+    :param vs30_list: list  vs30s of interest
+    :param imt_list:  list  imts of interest
+    :param agg_list:  list  agg types of interest (e.g., mean or "0.f" where f is a fractile
+    :param hazard_id: NSHM model id
+    :param batch_size: number of sites per batch
+    :param workers: number of batches queried at the same time
+    :param cache: local hazard curve cache
+
+    :return: np.array   hazard curves indexed by [n_vs30s, n_sites, n_imts, n_imtls, n_aggs]
+             list   intensities included
+    """
+    batches = [
+        slice(start, min(start + batch_size, len(sites)))
+        for start in range(0, len(sites), batch_size)
+    ]
+    query = (sites, vs30_list, imt_list, agg_list, hazard_id, batch_size)
+
+    with h5py.File(checkpoint_file, "a") as hf:
+        if not _checkpoint_matches(hf, *query):
+            _reset_checkpoint(hf, *query, len(batches))
+
+        todo = [i for i, done in enumerate(hf["batch_done"][:]) if not done]
+        log.info(
+            f"retrieve_hazard_curves_in_batches: {len(batches) - len(todo)} of "
+            f"{len(batches)} batches already in {checkpoint_file}"
+        )
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(
+                    q_haz.retrieve_hazard_curves,
+                    sites.iloc[batches[i_batch]],
+                    vs30_list,
+                    imt_list,
+                    agg_list,
+                    hazard_id,
+                    cache,
+                ): i_batch
+                for i_batch in todo
+            }
+            for future in as_completed(futures):
+                try:
+                    hcurves, imtl_list = future.result()
+                except Exception:
+                    for pending in futures:
+                        pending.cancel()
+                    raise
+
+                if "hcurves_stats" not in hf:
+                    shape = list(hcurves.shape)
+                    shape[1] = len(sites)
+                    hf.create_dataset("imtls", data=imtl_list)
+                    hf.create_dataset(
+                        "hcurves_stats",
+                        shape=shape,
+                        dtype=np.float64,
+                        fillvalue=-1,
+                    )
+                elif hf["imtls"][:].tolist() != imtl_list:
+                    raise ValueError(
+                        f"the intensity levels of batch {futures[future]} differ from "
+                        f"the levels in {checkpoint_file}"
+                    )
+
+                i_batch = futures[future]
+                hf["hcurves_stats"][:, batches[i_batch]] = hcurves
+                hf["batch_done"][i_batch] = True
+                hf.flush()
+                log.info(f"retrieve_hazard_curves_in_batches: saved batch {i_batch}")
+
+        hcurves = hf["hcurves_stats"][:]
+        imtl_list = hf["imtls"][:].tolist()
+
+    return hcurves, imtl_list
+
+
 def query_NSHM_to_hdf5(
     hf_name: Path,
     hazard_id: str,
     site_list: pd.DataFrame,
     site_limit: int = 0,
+    batch_size: int = 0,
+    workers: int = 1,
+    cache: Optional["HazardCurveCache"] = None,
 ):
     """Query the NSHM and save the results to an hdf5
 
@@ -265,6 +570,10 @@ def query_NSHM_to_hdf5(
         hazard_id: NSHM model id
         site_list: sites to include in the sa parameter table
         site_limit: for building test fixtures
+        batch_size: if set, query this many sites at a time and checkpoint each batch,
+            so that an interrupted query resumes from the completed batches
+        workers: number of batches to query at the same time
+        cache: local hazard curve cache, only the curves missing from it are queried
 
     Todo:
         - Chris BC, the default hazard_id should actually be part of your version control
@@ -272,9 +581,23 @@ def query_NSHM_to_hdf5(
     """
 
     # query NSHM
-    hcurves, _ = q_haz.retrieve_hazard_curves(
-        site_list, VS30_LIST, IMT_LIST, AGG_LIST, hazard_id
-    )
+    if batch_size:
+        checkpoint_file = checkpoint_filepath(hf_name)
+        hcurves, _ = retrieve_hazard_curves_in_batches(
+            checkpoint_file,
+            site_list,
+            VS30_LIST,
+            IMT_LIST,
+            AGG_LIST,
+            hazard_id,
+            batch_size,
+            workers,
+            cache,
+        )
+    else:
+        hcurves, _ = q_haz.retrieve_hazard_curves(
+            site_list, VS30_LIST, IMT_LIST, AGG_LIST, hazard_id, cache
+        )
 
     # prep hcurves dictionary
     data = create_hcurve_dictionary(
@@ -286,3 +609,6 @@ def query_NSHM_to_hdf5(
 
     # save file
     save_hdf(hf_name, data)
+
+    if batch_size:
+        checkpoint_file.unlink()
@@ -4,6 +4,7 @@ This package encapsulates Anne Hulsey's data processing pipeline.
 Modules:
  constants: defined constants for this module
  query_NSHM: get hazard data from the NSHM hazard API.
+ curve_cache: a persistent local cache of the NSHM hazard curves.
  NSHM_to_hdf5: helper functions for saving hazard data as an HDF5 file.
  extract_data: helper functions to read the the NSHM hdf5.
  sa_parameter_generation: derives the PGA, Sa,s, and Tc parameters from the NSHM hazard curves.
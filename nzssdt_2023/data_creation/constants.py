@@ -177,6 +177,13 @@ SAS_N_DP = 2
 PSV_N_DP = 2
 TC_N_SF = 2
 
+# layout of the hazard hdf5 written by `NSHM_to_hdf5.save_hdf`
+# (version 1 files, without a version attribute, store the metadata as str(dict) attributes)
+HDF5_FORMAT_VERSION = 2
+# number of sites per hdf5 chunk and the (lossless) compression filter of the hazard datasets
+HDF5_SITE_CHUNK_SIZE = 16
+HDF5_COMPRESSION = "gzip"
+
 # url for zipped Community Fault Model
 CFM_URL = r"https://www.gns.cri.nz/assets/Data-and-Resources/Download-files/Community-Hazard-Model/NZ_CFM_v1_0_shapefile.zip"  # noqa
 
@@ -0,0 +1,136 @@
+"""
+A persistent local cache of NSHM hazard curves, so that only missing curves are queried.
+
+The curves are stored in an SQLite file keyed by (hazard_id, location, vs30, imt, agg).
+"""
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple, Union
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+CurveKey = Tuple[str, int, str, str]
+"""(location, vs30, imt, agg) of a hazard curve, the location is a code e.g., "-41.300~174.780" """
+
+CurveLevelsValues = Tuple[List[float], List[float]]
+"""the intensity levels and the probabilities of exceedance of a hazard curve"""
+
+
+class HazardCurveCache:
+    """A persistent cache of hazard curves, with hit and miss statistics
+
+    The cache can be shared by the threads of a batched query.
+
+    Examples:
+        >>> cache = HazardCurveCache(Path(WORKING_FOLDER) / "hcurve_cache.sqlite")
+        >>> cached = cache.get_curves("NSHM_v1.0.4", [("-41.300~174.780", 400, "PGA", "mean")])
+        >>> cache.stats()
+        {'hits': 1, 'misses': 0, 'entries': 3240}
+    """
+
+    def __init__(self, db_path: Union[str, Path]):
+        self.db_path = Path(db_path)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS hazard_curves ("
+                " hazard_id TEXT NOT NULL, location TEXT NOT NULL, vs30 INTEGER NOT NULL,"
+                " imt TEXT NOT NULL, agg TEXT NOT NULL, levels BLOB NOT NULL,"
+                " curve_values BLOB NOT NULL,"
+                " PRIMARY KEY (hazard_id, location, vs30, imt, agg))"
+            )
+
+    def __repr__(self):
+        return f"HazardCurveCache({str(self.db_path)!r})"
+
+    def close(self):
+        self._connection.close()
+
+    def get_curves(
+        self, hazard_id: str, keys: Iterable[CurveKey]
+    ) -> Dict[CurveKey, CurveLevelsValues]:
+        """Look up hazard curves, counting the hits and misses
+
+        Args:
+            hazard_id: NSHM model id
+            keys: (location, vs30, imt, agg) of the curves
+
+        Returns:
+            cached: the levels and values of the curves found in the cache
+        """
+        keys = set(keys)
+        cached = {}
+        with self._lock:
+            for location in {key[0] for key in keys}:
+                rows = self._connection.execute(
+                    "SELECT vs30, imt, agg, levels, curve_values FROM hazard_curves"
+                    " WHERE hazard_id = ? AND location = ?",
+                    (hazard_id, location),
+                )
+                for vs30, imt, agg, levels, curve_values in rows:
+                    if (location, vs30, imt, agg) in keys:
+                        cached[(location, vs30, imt, agg)] = (
+                            np.frombuffer(levels).tolist(),
+                            np.frombuffer(curve_values).tolist(),
+                        )
+            self.hits += len(cached)
+            self.misses += len(keys) - len(cached)
+        return cached
+
+    def put_curves(
+        self, hazard_id: str, curves: Dict[CurveKey, CurveLevelsValues]
+    ) -> None:
+        """Add or replace hazard curves
+
+        Args:
+            hazard_id: NSHM model id
+            curves: the levels and values of the curves, keyed by (location, vs30, imt, agg)
+        """
+        rows = [
+            (
+                hazard_id,
+                location,
+                int(vs30),
+                imt,
+                agg,
+                np.asarray(levels, dtype=np.float64).tobytes(),
+                np.asarray(values, dtype=np.float64).tobytes(),
+            )
+            for (location, vs30, imt, agg), (levels, values) in curves.items()
+        ]
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO hazard_curves VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def prune(self, hazard_id: str) -> int:
+        """Remove all curves of a hazard model
+
+        Args:
+            hazard_id: NSHM model id
+
+        Returns:
+            n_removed: number of curves removed
+        """
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "DELETE FROM hazard_curves WHERE hazard_id = ?", (hazard_id,)
+            )
+        log.info(f"pruned {cursor.rowcount} curves of {hazard_id} from {self}")
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        """The cache hits and misses since the cache was opened and the number of cached curves"""
+        with self._lock:
+            (entries,) = self._connection.execute(
+                "SELECT COUNT(*) FROM hazard_curves"
+            ).fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
@@ -1,28 +1,24 @@
 """
 This module compiles the magnitude and distances values for the parameter table.
-
-TODO:
-    - `extract_m_values` uses/builds entire mean mag tables independent of what locations and PoEs
-        are requested in function args.
-    - Consolidate the mean mag csv files into one cache rather than 3 separate files. Any locations/poes
-        not available can be looked up and added to the cache.
 """
-import itertools
+from collections import defaultdict
 from pathlib import Path
-from typing import TYPE_CHECKING, List
+from typing import TYPE_CHECKING, DefaultDict, Dict, List, Tuple
 
 import numpy as np
 import pandas as pd
-from toshi_hazard_store.model import AggregationEnum
+from nzshm_common.location import CodedLocation
+from toshi_hazard_store.model import AggregationEnum, ProbabilityEnum
 
 from nzssdt_2023.data_creation.constants import DEFAULT_RPS
 from nzssdt_2023.data_creation.gis_data import build_d_value_dataframe
 from nzssdt_2023.data_creation.mean_magnitudes import (
-    empty_mean_mag_df,
+    DTYPE,
+    MeanMagnitudeStore,
     frequency_to_poe,
-    get_mean_mag,
     get_mean_mag_df,
-    read_mean_mag_df,
+    poe_to_rp,
+    rp_to_freqstr,
     site_name_to_coded_location,
 )
 from nzssdt_2023.data_creation.sa_parameter_generation import replace_relevant_locations
@@ -38,6 +34,15 @@ from nzssdt_2023.config import DISAGG_HAZARD_ID, WORKING_FOLDER
 pd.options.mode.copy_on_write = True
 
 
+def mean_mag_store_filepath() -> Path:
+    """The path of the mean magnitude store
+
+    Returns:
+        path: `mean_mags.sqlite` in the WORKING_FOLDER
+    """
+    return Path(WORKING_FOLDER) / "mean_mags.sqlite"
+
+
 def extract_m_values(
     site_names: List[str],
     freqs: List[str],
@@ -45,7 +50,7 @@ def extract_m_values(
     no_cache: bool = False,
     legacy: bool = False,
 ) -> "pdt.DataFrame":
-    """Extracts the magnitudes from the input .csv folder into a manageable dataframe
+    """Extracts the mean magnitudes for the sites and frequencies of interest
 
     Args:
         site_names: names of sites of interest
@@ -59,9 +64,9 @@ def extract_m_values(
 
     The format of the frequencies entries is e.g. "APoE: 1/25"
 
-    If no_cache is False then the mean magnitudes will be looked up in a cache file. If not found
-    there, they will be calculated and added to the cache. The cache file is in the WORKING_FOLDER
-    named mags_{agg}.csv where {agg} is the hazard curve aggregate.
+    If no_cache is False then the mean magnitudes will be looked up in the mean magnitude store
+    (`mean_mags.sqlite` in the WORKING_FOLDER), keyed by hazard id, aggregate, location, poe and
+    legacy. Any that are not found there are calculated in bulk and added to the store.
 
     site names are location names or lat~lon codes e.g. "Pukekohe" or "-45.500~166.600"
     """
@@ -72,30 +77,47 @@ def extract_m_values(
     if no_cache:
         return get_mean_mag_df(DISAGG_HAZARD_ID, locations, poes, agg, legacy)
 
-    cache_filepath = Path(WORKING_FOLDER) / f"mag_agg-{agg.name}.csv"
-    if cache_filepath.exists():
-        mags = read_mean_mag_df(cache_filepath)
-    else:
-        poes = [frequency_to_poe(freq) for freq in freqs]
-        mags = empty_mean_mag_df(poes)
-        mags = get_mean_mag_df(DISAGG_HAZARD_ID, locations, poes, agg, legacy)
-        mags.to_csv(cache_filepath)
-        return mags.loc[site_names, freqs]
-
-    # fill in the missing values one at a time
-    for site, freq in itertools.product(site_names, freqs):
-        if (
-            (site not in mags.index)
-            or (freq not in mags.columns)
-            or (pd.isnull(mags.loc[site, freq]))
-        ):
-            location = site_name_to_coded_location(site)
-            poe = frequency_to_poe(freq)
-            mag = get_mean_mag(DISAGG_HAZARD_ID, location, poe, agg, legacy)
-            mags.loc[site, freq] = mag
-
-    mags.to_csv(cache_filepath)
-    return mags.loc[site_names, freqs]
+    store = MeanMagnitudeStore(mean_mag_store_filepath())
+    location_codes = [location.code for location in locations]
+    mags = store.get_mags(DISAGG_HAZARD_ID, agg, location_codes, poes, legacy)
+
+    # group the locations by their missing poes, so each group is one query
+    missing_locations: DefaultDict[
+        Tuple[ProbabilityEnum, ...], Dict[str, CodedLocation]
+    ] = defaultdict(dict)
+    for location, location_mags in zip(locations, mags.to_numpy()):
+        missing_poes = tuple(
+            poe for poe, mag in zip(poes, location_mags) if np.isnan(mag)
+        )
+        if missing_poes:
+            missing_locations[missing_poes][location.code] = location
+
+    # fetch the missing values in bulk and add them to the store in one write
+    new_mags = []
+    for missing_poes, group in missing_locations.items():
+        group_mags = get_mean_mag_df(
+            DISAGG_HAZARD_ID, list(group.values()), list(missing_poes), agg, legacy
+        )
+        new_mags.append(
+            pd.DataFrame(
+                group_mags[
+                    [rp_to_freqstr(poe_to_rp(poe)) for poe in missing_poes]
+                ].to_numpy(),
+                index=list(group.keys()),
+                columns=list(missing_poes),
+            )
+        )
+
+    if new_mags:
+        store.put_mags(DISAGG_HAZARD_ID, agg, pd.concat(new_mags), legacy)
+        mags = store.get_mags(DISAGG_HAZARD_ID, agg, location_codes, poes, legacy)
+
+    return pd.DataFrame(
+        mags.to_numpy(),
+        index=pd.Index(site_names, name="site_name"),
+        columns=freqs,
+        dtype=DTYPE,
+    )
 
 
 def create_D_and_M_df(
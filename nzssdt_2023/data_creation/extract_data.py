@@ -2,96 +2,240 @@
 This module extracts the data and metadata in the hdf5 containing the NSHM data.
 """
 import ast
+from contextlib import contextmanager
+from functools import cached_property
 from pathlib import Path
-from typing import TYPE_CHECKING, List, Tuple
+from typing import TYPE_CHECKING, Iterator, List, Optional, Tuple, Union
 
 import h5py
 import pandas as pd
 
+from nzssdt_2023.data_creation.constants import HDF5_FORMAT_VERSION
+
 if TYPE_CHECKING:
     import numpy.typing as npt
     import pandas.typing as pdt
 
 
-def extract_spectra(data_file: str | Path) -> Tuple["npt.NDArray", dict]:
+class HazardDataset:
+    """A read-only view of the hazard hdf5 that opens the file once.
+
+    The metadata and spectra are read lazily on first access and cached, so the
+    stages of a table build can share one instance instead of re-opening and
+    re-parsing the file. The spectra are returned as read-only arrays because they
+    are shared by every caller.
+
+    Examples:
+        >>> with HazardDataset(hf_path) as dataset:
+        ...     acc_spectra, imtls = dataset.spectra()
+        ...     site_list = list(dataset.sites.index)
+    """
+
+    def __init__(self, data_file: str | Path):
+        self.data_file = Path(data_file)
+        self._hf: Optional[h5py.File] = None
+
+    def __enter__(self) -> "HazardDataset":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return f"HazardDataset({str(self.data_file)!r})"
+
+    @property
+    def hf(self) -> h5py.File:
+        """the open hdf5 file handle (opened on first use)"""
+        if self._hf is None:
+            self._hf = h5py.File(self.data_file, "r")
+        return self._hf
+
+    @cached_property
+    def format_version(self) -> int:
+        """layout version of the hdf5 (1 for legacy files without the attribute)"""
+        return int(self.hf.attrs.get("format_version", 1))
+
+    def close(self):
+        """Close the file handle, values that have already been read remain cached."""
+        if self._hf is not None:
+            self._hf.close()
+            self._hf = None
+
+    def _check_format_version(self):
+        if self.format_version > HDF5_FORMAT_VERSION:
+            raise ValueError(
+                f"{self.data_file} has hdf5 format version {self.format_version}, "
+                f"only versions up to {HDF5_FORMAT_VERSION} can be read"
+            )
+
+    @cached_property
+    def imtls(self) -> dict:
+        """keys: intensity measures e.g., SA(1.0), values: list of intensity levels"""
+        self._check_format_version()
+        metadata = self.hf["metadata"]
+        if self.format_version == 1:
+            return ast.literal_eval(metadata.attrs["acc_imtls"])
+
+        return {
+            imt: levels[:].tolist() for imt, levels in metadata["acc_imtls"].items()
+        }
+
+    @cached_property
+    def sites(self) -> "pdt.DataFrame":
+        """dataframe of sites with lat/lons"""
+        self._check_format_version()
+        metadata = self.hf["metadata"]
+        if self.format_version == 1:
+            return pd.DataFrame(ast.literal_eval(metadata.attrs["sites"]))
+
+        records = metadata["sites"][:]
+        columns = {
+            field: [value.decode() for value in records[field]]
+            for field in records.dtype.names
+        }
+        index = columns.pop("site")
+        return pd.DataFrame(columns, index=index)
+
+    @cached_property
+    def vs30s(self) -> List[int]:
+        """vs30s included in the hdf5"""
+        return list(self.hf["metadata"].attrs["vs30s"])
+
+    @cached_property
+    def quantiles(self) -> List[float]:
+        """hazard quantiles included in the hdf5"""
+        return list(self.hf["metadata"].attrs["quantiles"])
+
+    @cached_property
+    def hazard_rps(self) -> List[int]:
+        """return periods of the uniform hazard spectra"""
+        return list(self.hf["hazard_design"].attrs["hazard_rps"])
+
+    @property
+    def APoEs(self) -> List[str]:
+        """APoE strings of the uniform hazard spectra"""
+        return [f"APoE: 1/{hazard_rp}" for hazard_rp in self.hazard_rps]
+
+    @cached_property
+    def acc_spectra(self) -> "npt.NDArray":
+        """acceleration spectra (dimensions: vs30, site, intensity measure, return period, statistic)"""
+        acc_spectra = self.hf["hazard_design"]["acc"]["stats_im_hazard"][:]
+        acc_spectra.setflags(write=False)
+        return acc_spectra
+
+    def spectra(self, site_slice: Optional[slice] = None) -> Tuple["npt.NDArray", dict]:
+        """The uniform hazard spectra and intensity measure levels
+
+        Only the requested range of sites is read if the full spectra are not cached yet,
+        a slice of all sites is the same as no slice and returns the cached spectra.
+
+        Args:
+            site_slice: if given, only return this range of sites
+
+        Returns:
+            acc_spectra: acceleration spectra (dimensions: vs30, site, return period, statistic)
+            imtls: keys: intensity measures e.g., SA(1.0), values: list of intensity levels
+        """
+        if site_slice is None or site_slice == slice(None):
+            return self.acc_spectra, self.imtls
+
+        if "acc_spectra" in self.__dict__:
+            return self.acc_spectra[:, site_slice], self.imtls
+
+        acc_spectra = self.hf["hazard_design"]["acc"]["stats_im_hazard"][:, site_slice]
+        return acc_spectra, self.imtls
+
+
+@contextmanager
+def open_dataset(data_file: Union[str, Path, HazardDataset]) -> Iterator[HazardDataset]:
+    """Use an existing `HazardDataset` as is, or open (and close) one for a file name
+
+    Args:
+        data_file: name of hazard hdf5 file, or an open dataset
+
+    Yields:
+        dataset: the hazard dataset
+    """
+    if isinstance(data_file, HazardDataset):
+        yield data_file
+    else:
+        with HazardDataset(data_file) as dataset:
+            yield dataset
+
+
+def extract_spectra(
+    data_file: Union[str, Path, HazardDataset], site_slice: Optional[slice] = None
+) -> Tuple["npt.NDArray", dict]:
     """Extract the uniform hazard spectra from the hdf5
 
     Args:
-        data_file: name of hazard hdf5 file
+        data_file: name of hazard hdf5 file, or an open dataset
+        site_slice: if given, only read this range of sites
 
     Returns:
         acc_spectra: acceleration spectra (dimensions: vs30, site, return period, statistic)
         imtls: keys: intensity measures e.g., SA(1.0), values: list of intensity levels
 
     """
-    with h5py.File(data_file, "r") as hf:
-        imtls = ast.literal_eval(hf["metadata"].attrs["acc_imtls"])
-        acc_spectra = hf["hazard_design"]["acc"]["stats_im_hazard"][:]
-
-    return acc_spectra, imtls
+    with open_dataset(data_file) as dataset:
+        return dataset.spectra(site_slice)
 
 
-def extract_vs30s(data_file: str | Path) -> List[int]:
+def extract_vs30s(data_file: Union[str, Path, HazardDataset]) -> List[int]:
     """Extract the vs30 values from the hdf5
 
     Args:
-        data_file: name of hazard hdf5 file
+        data_file: name of hazard hdf5 file, or an open dataset
 
     Returns:
         vs30_list: list of vs30s included in hdf5
 
     """
-    with h5py.File(data_file, "r") as hf:
-        vs30_list = list(hf["metadata"].attrs["vs30s"])
+    with open_dataset(data_file) as dataset:
+        return list(dataset.vs30s)
 
-    return vs30_list
 
-
-def extract_quantiles(data_file: str | Path) -> List[float]:
+def extract_quantiles(data_file: Union[str, Path, HazardDataset]) -> List[float]:
     """Extract hazard quantiles from the hdf5
 
     Args:
-        data_file: name of hazard hdf5 file
+        data_file: name of hazard hdf5 file, or an open dataset
 
     Returns:
         quantiles: list of quantiles
 
     """
-    with h5py.File(data_file, "r") as hf:
-        quantiles = list(hf["metadata"].attrs["quantiles"])
-
-    return quantiles
+    with open_dataset(data_file) as dataset:
+        return list(dataset.quantiles)
 
 
-def extract_sites(data_file: str | Path) -> "pdt.DataFrame":
+def extract_sites(data_file: Union[str, Path, HazardDataset]) -> "pdt.DataFrame":
     """Extract sites from the hdf5
 
     Args:
-        data_file: name of hazard hdf5 file
+        data_file: name of hazard hdf5 file, or an open dataset
 
     Returns:
         sites: dataframe of sites with lat/lons
 
     """
-    with h5py.File(data_file, "r") as hf:
-        sites = pd.DataFrame(ast.literal_eval(hf["metadata"].attrs["sites"]))
+    with open_dataset(data_file) as dataset:
+        return dataset.sites
 
-    return sites
 
-
-def extract_APoEs(data_file: str | Path) -> Tuple[List[str], List[int]]:
+def extract_APoEs(
+    data_file: Union[str, Path, HazardDataset]
+) -> Tuple[List[str], List[int]]:
     """Extract uniform hazard spectra annual probabilities of exceedance from the hdf5
 
     Args:
-        data_file: name of hazard hdf5 file
+        data_file: name of hazard hdf5 file, or an open dataset
 
     Returns:
         APoEs: list of APoE strings
         hazard_rp_list: list of return periods
 
     """
-    with h5py.File(data_file, "r") as hf:
-        hazard_rp_list = list(hf["hazard_design"].attrs["hazard_rps"])
-    APoEs = [f"APoE: 1/{hazard_rp}" for hazard_rp in hazard_rp_list]
-
-    return APoEs, hazard_rp_list
+    with open_dataset(data_file) as dataset:
+        return dataset.APoEs, list(dataset.hazard_rps)
@@ -9,6 +9,7 @@ from pathlib import Path
 from typing import TYPE_CHECKING, List, Tuple, Union
 
 import geopandas as gpd
+import numpy as np
 import pandas as pd
 
 from nzssdt_2023.config import WORKING_FOLDER
@@ -26,6 +27,9 @@ if TYPE_CHECKING:
 
 log = logging.getLogger(__name__)
 
+D_CUTOFF_METERS = 20_000
+"""locations at or beyond this distance from a fault have no D value"""
+
 
 def save_gdf_to_geojson(gdf: "gpdt.DataFrame", path, include_idx=False):
     """Saves a geodataframe to a .geojson file
@@ -142,12 +146,20 @@ def calc_distance_to_faults(
     faults.to_crs(epsg=meter_epsg, inplace=True)
     gdf.to_crs(epsg=meter_epsg, inplace=True)
 
-    gdf["distance"] = round(
-        gdf.geometry.apply(lambda x: faults.distance(x).min()) / 1000.0
+    # only the nearest fault within the D cutoff is needed, locations further
+    # away are set to the cutoff and their D value to None below
+    (location_idx, _), distances = faults.sindex.nearest(
+        gdf.geometry,
+        max_distance=D_CUTOFF_METERS,
+        return_distance=True,
+        return_all=False,
     )
+    distance = np.full(len(gdf), float(D_CUTOFF_METERS))
+    distance[location_idx] = distances
+    gdf["distance"] = np.round(distance / 1000.0)
 
     gdf["D"] = gdf["distance"].astype("int")
-    gdf.loc[gdf["D"] >= 20, "D"] = None
+    gdf.loc[gdf["D"] >= D_CUTOFF_METERS / 1000, "D"] = None
 
     wgs_epsg = 4326
     gdf.to_crs(epsg=wgs_epsg, inplace=True)
@@ -2,8 +2,11 @@
 This module contains functions for extracting mean magnitudes from disaggregations and packaging into DataFrame objects.
 """
 
+import sqlite3
+from contextlib import closing
+from functools import lru_cache
 from pathlib import Path
-from typing import TYPE_CHECKING, Any, Dict, Generator, Iterable, List, Union
+from typing import TYPE_CHECKING, Any, Dict, Generator, Iterable, List, Tuple, Union
 
 import numpy as np
 import pandas as pd
@@ -22,25 +25,30 @@ IMT = "PGA"
 DTYPE = float
 
 
-coded_locations_with_id = [
-    CodedLocation(*lat_lon_from_id(_id), 0.001)
-    for _id in LOCATION_LISTS["ALL"]["locations"]
-]
-location_codes_with_id = [loc.code for loc in coded_locations_with_id]
+@lru_cache(maxsize=None)
+def _location_id_index() -> Dict[str, Tuple[str, str]]:
+    """location code -> (location id, name) for every location with an `nzshm-common` id
 
+    built on first use rather than on import, the first id wins if two share a code
+    """
+    index: Dict[str, Tuple[str, str]] = {}
+    for location_id in LOCATION_LISTS["ALL"]["locations"]:
+        code = CodedLocation(*lat_lon_from_id(location_id), 0.001).code
+        index.setdefault(code, (location_id, location_by_id(location_id)["name"]))
+    return index
 
-def get_loc_id_and_name(location_code):
 
-    if location_code in location_codes_with_id:
-        location_id = LOCATION_LISTS["ALL"]["locations"][
-            location_codes_with_id.index(location_code)
-        ]
-        name = location_by_id(location_id)["name"]
-    else:
-        location_id = location_code
-        name = location_code
+def get_loc_id_and_name(location_code: str) -> Tuple[str, str]:
+    """get the `nzshm-common` location id and name of a location code
 
-    return location_id, name
+    Args:
+        location_code: the location code e.g., "-36.870~174.770"
+
+    Returns:
+        location_id: the location id, or the location code if the location has no id
+        name: the location name, or the location code if the location has no id
+    """
+    return _location_id_index().get(location_code, (location_code, location_code))
 
 
 def site_name_to_coded_location(site_name: str) -> CodedLocation:
@@ -96,9 +104,36 @@ def calculate_mean_magnitude(disagg: "npt.NDArray", bins: "npt.NDArray"):
             This function assumes that disaggregations are for magnitude only."""
         )
 
-    disagg = prob_to_rate(disagg)
+    return calculate_mean_magnitudes(disagg[np.newaxis, :], bins)[0]
+
+
+def calculate_mean_magnitudes(disaggs: "npt.NDArray", bins: "npt.NDArray"):
+    """
+    Calculate the mean magnitudes for many sites that share the magnitude bins.
+
+    Parameters:
+        disaggs: The probability contribution to hazard of the magnitude bins (in apoe), one row per site.
+        bins: The bin centers of the magnitude disaggregation.
+
+    Returns:
+        the mean magnitude of each row of disaggs
+    """
+    shape_bins = bins.shape
+    shape_disaggs = disaggs.shape
+    if (
+        len(shape_bins) != 2
+        or shape_bins[0] != 1
+        or len(shape_disaggs) != 2
+        or shape_bins[1] != shape_disaggs[1]
+    ):
+        raise Exception(
+            """Disaggregations do not have the correct shape.
+            This function assumes that disaggregations are for magnitude only."""
+        )
+
+    rates = prob_to_rate(disaggs)
 
-    return np.sum(disagg / np.sum(disagg) * bins[0])
+    return np.sum(rates / np.sum(rates, axis=1, keepdims=True) * bins[0], axis=1)
 
 
 def get_mean_mags(
@@ -146,8 +181,21 @@ def get_mean_mags(
         imts=imts,
         probabilities=poes,
     )
-    for disagg in disaggs:
-        mean_mag = calculate_mean_magnitude(disagg.disaggs, disagg.bins)
+
+    # stack the disaggregations that share bins so each group is one array calculation
+    disaggs = list(disaggs)
+    groups: Dict[bytes, List[int]] = {}
+    for i, disagg in enumerate(disaggs):
+        bins = np.asarray(disagg.bins)
+        groups.setdefault(bins.tobytes() + str(bins.shape).encode(), []).append(i)
+
+    mean_mags = np.empty(len(disaggs))
+    for indices in groups.values():
+        mean_mags[indices] = calculate_mean_magnitudes(
+            np.stack([disaggs[i].disaggs for i in indices]), disaggs[indices[0]].bins
+        )
+
+    for disagg, mean_mag in zip(disaggs, mean_mags):
         location_id, name = get_loc_id_and_name(disagg.nloc_001)
 
         d = dict(
@@ -200,6 +248,114 @@ def read_mean_mag_df(filepath: Union[Path, str]) -> pd.DataFrame:
     return df.astype(DTYPE)
 
 
+class MeanMagnitudeStore:
+    """A persistent store of mean magnitudes keyed by (hazard_id, agg, location, poe, legacy)
+
+    The store is an SQLite file. Every lookup and upsert opens its own connection and
+    transaction, so the store can be shared by concurrent pipeline processes.
+
+    Examples:
+        >>> store = MeanMagnitudeStore(Path(WORKING_FOLDER) / "mean_mags.sqlite")
+        >>> store.put_mags(hazard_id, agg, mags_df, legacy=False)
+        >>> store.get_mags(hazard_id, agg, ["-41.300~174.780"], poes, legacy=False)
+    """
+
+    def __init__(self, db_path: Union[Path, str], timeout: float = 60.0):
+        self.db_path = Path(db_path)
+        self.timeout = timeout
+        with closing(self._connect()) as connection, connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS mean_mags ("
+                " hazard_id TEXT NOT NULL, agg TEXT NOT NULL, location TEXT NOT NULL,"
+                " poe TEXT NOT NULL, legacy INTEGER NOT NULL, mag REAL NOT NULL,"
+                " PRIMARY KEY (hazard_id, agg, legacy, location, poe))"
+            )
+
+    def __repr__(self):
+        return f"MeanMagnitudeStore({str(self.db_path)!r})"
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=self.timeout)
+
+    def get_mags(
+        self,
+        hazard_id: str,
+        hazard_agg: model.AggregationEnum,
+        locations: List[str],
+        poes: List[model.ProbabilityEnum],
+        legacy: bool = False,
+    ) -> pd.DataFrame:
+        """
+        Look up the stored mean magnitudes.
+
+        Args:
+            hazard_id: the toshi-hazard-post ID of the hazard model.
+            hazard_agg: the hazard aggregate (e.g. mean or a fractile).
+            locations: the location codes e.g., "-41.300~174.780".
+            poes: the annual probabilities of exceedence.
+            legacy: if True look up the double rounded magnitudes.
+
+        Returns:
+            the magnitudes, NaN where not stored. The index is the locations and the columns are the poes.
+
+        Only the requested locations and poes are read, the locations are joined against a
+        temporary table of the requested codes.
+        """
+        poe_names = [poe.name for poe in poes]
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "CREATE TEMP TABLE requested_locations (location TEXT PRIMARY KEY)"
+            )
+            connection.executemany(
+                "INSERT OR IGNORE INTO requested_locations VALUES (?)",
+                ((location,) for location in locations),
+            )
+            stored = pd.read_sql_query(
+                "SELECT mean_mags.location, poe, mag FROM mean_mags"
+                " JOIN requested_locations USING (location)"
+                " WHERE hazard_id = ? AND agg = ? AND legacy = ?"
+                f" AND poe IN ({', '.join('?' * len(poe_names))})",
+                connection,
+                params=(hazard_id, hazard_agg.value, int(legacy), *poe_names),
+            )
+        mags = stored.pivot(index="location", columns="poe", values="mag")
+        mags = mags.reindex(index=locations, columns=poe_names)
+        mags.columns = poes
+        return mags.astype(DTYPE)
+
+    def put_mags(
+        self,
+        hazard_id: str,
+        hazard_agg: model.AggregationEnum,
+        mags: pd.DataFrame,
+        legacy: bool = False,
+    ):
+        """
+        Add or update mean magnitudes, NaN values are skipped.
+
+        Args:
+            hazard_id: the toshi-hazard-post ID of the hazard model.
+            hazard_agg: the hazard aggregate (e.g. mean or a fractile).
+            mags: the magnitudes, the index is location codes and the columns are poes.
+            legacy: if True the magnitudes are double rounded.
+        """
+        poes: List[model.ProbabilityEnum] = list(mags.columns)
+        rows = [
+            (hazard_id, hazard_agg.value, location, poe.name, int(legacy), float(mag))
+            for location, location_mags in zip(mags.index, mags.to_numpy())
+            for poe, mag in zip(poes, location_mags)
+            if not np.isnan(mag)
+        ]
+        with closing(self._connect()) as connection, connection:
+            connection.executemany(
+                "INSERT INTO mean_mags VALUES (?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (hazard_id, agg, legacy, location, poe)"
+                " DO UPDATE SET mag = excluded.mag",
+                rows,
+            )
+
+
 def rp_to_freqstr(rp: int):
     return f"APoE: 1/{rp}"
 
@@ -268,18 +424,35 @@ def get_mean_mag_df(
     site_names = [
         get_loc_id_and_name(loc.downsample(0.001).code)[1] for loc in locations
     ]
-    df = pd.DataFrame(index=site_names, columns=rp_strs, dtype=DTYPE)
+    site_rows: Dict[str, List[int]] = {}
+    for row, site_name in enumerate(site_names):
+        site_rows.setdefault(site_name, []).append(row)
+    rp_columns = {rp_str: column for column, rp_str in enumerate(rp_strs)}
+
+    rows, columns, mag_list = [], [], []
     for disagg in get_mean_mags(hazard_id, locations, [VS30], [IMT], poes, hazard_agg):
-        rp = poe_to_rp(disagg["poe"])
-        rp_str = rp_to_freqstr(rp)
-        site_name = disagg["name"]
-        if legacy:
-            df.loc[site_name, rp_str] = np.round(np.round(disagg["mag"], 2), 1)
-        else:
-            df.loc[site_name, rp_str] = np.round(disagg["mag"], 1)
-
-    df.index.name = "site_name"
-    return df
+        if disagg["name"] not in site_rows:
+            raise ValueError(
+                f"the disaggregations include {disagg['name']}, "
+                "which is not one of the requested locations"
+            )
+        column = rp_columns[rp_to_freqstr(poe_to_rp(disagg["poe"]))]
+        for row in site_rows[disagg["name"]]:
+            rows.append(row)
+            columns.append(column)
+            mag_list.append(disagg["mag"])
+
+    mags = np.asarray(mag_list, dtype=DTYPE)
+    if legacy:
+        mags = np.round(np.round(mags, 2), 1)
+    else:
+        mags = np.round(mags, 1)
+
+    values = np.full((len(site_names), len(rp_strs)), np.nan, dtype=DTYPE)
+    values[rows, columns] = mags
+    return pd.DataFrame(
+        values, index=pd.Index(site_names, name="site_name"), columns=rp_strs
+    )
 
 
 def get_mean_mag(
@@ -4,8 +4,10 @@ Functions to get hazard data from the NSHM hazard API.
 """
 import datetime
 import datetime as dt
+import itertools
 import logging
-from typing import TYPE_CHECKING, List, Optional, Tuple
+from collections import defaultdict
+from typing import TYPE_CHECKING, Dict, Hashable, Iterable, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
@@ -20,6 +22,8 @@ if TYPE_CHECKING:
     import numpy.typing as npt
     import pandas.typing as pdt
 
+    from nzssdt_2023.data_creation.curve_cache import HazardCurveCache
+
 log = logging.getLogger(__name__)
 
 
@@ -141,22 +145,59 @@ def create_sites_df(
     return sites.sort_values(by=["lat", "lon"])
 
 
+def first_index_map(values: Iterable[Hashable]) -> Dict[Hashable, int]:
+    """
+    maps each value to the index of its first occurrence, i.e. a precomputed `list.index`
+
+    Args:
+        values: the values to index
+
+    Returns:
+        dictionary  keys: values, values: index of the first occurrence
+    """
+    index_map: Dict[Hashable, int] = {}
+    for i, value in enumerate(values):
+        index_map.setdefault(value, i)
+    return index_map
+
+
+def site_index_map(sites: "pdt.DataFrame") -> Dict[str, List[int]]:
+    """
+    maps each location code to the indices of all sites at that location
+
+    Args:
+        sites: idx: sites, cols: ['latlon', 'lat', 'lon']
+
+    Returns:
+        dictionary  keys: location codes e.g., "-41.300~174.780", values: site indices
+    """
+    index_map: Dict[str, List[int]] = defaultdict(list)
+    for i_site, latlon in enumerate(sites["latlon"]):
+        index_map[latlon].append(i_site)
+    return dict(index_map)
+
+
 def retrieve_hazard_curves(
     sites: "pdt.DataFrame",
     vs30_list: List[int],
     imt_list: List[str],
     agg_list: List[str],
     hazard_id: str,
+    cache: Optional["HazardCurveCache"] = None,
 ) -> Tuple["npt.NDArray", List[float]]:
     """
     retrieves the hazard curves for the sites, vs30s, imts, and aggs of interest
 
+    With a cache, only the locations, vs30s, imts, and aggs of the curves missing from the
+    cache are queried, and the queried curves are added to the cache.
+
     Args:
         sites: idx: sites, cols: ['latlon', 'lat', 'lon']
         vs30_list:  vs30s of interest
         imt_list:   imts of interest
         agg_list:   agg types of interest (e.g., mean or "0.f" where f is a fractile
         hazard_id:  query the NSHM
+        cache:      local hazard curve cache
 
     Returns:
         np.array   hazard curves indexed by [n_vs30s, n_sites, n_imts, n_imtls, n_aggs]
@@ -167,31 +208,81 @@ def retrieve_hazard_curves(
         f"begin retrieve_hazard_curves for {len(sites)} sites; {len(vs30_list)} vs30;  {len(agg_list)} aggs;"
     )
 
-    # call a location to get the imtls that are returned
-    res = next(
-        get_hazard_curves(
-            sites["latlon"][:1], vs30_list[:1], [hazard_id], imt_list[:1], agg_list[:1]
-        )
+    # look up the cached curves and reduce the query to the missing ones
+    cached: Dict[Tuple[str, int, str, str], Tuple[List[float], List[float]]] = {}
+    query_locs, query_vs30s, query_imts, query_aggs = (
+        sites["latlon"],
+        vs30_list,
+        imt_list,
+        agg_list,
     )
-    imtl_list = [float(val.lvl) for val in res.values]
+    if cache is not None:
+        keys = list(
+            itertools.product(
+                dict.fromkeys(sites["latlon"]), vs30_list, imt_list, agg_list
+            )
+        )
+        cached = cache.get_curves(hazard_id, keys)
+        missing = [key for key in keys if key not in cached]
+        query_locs = list(dict.fromkeys(key[0] for key in missing))
+        missing_vs30s, missing_imts, missing_aggs = (
+            {key[i] for key in missing} for i in range(1, 4)
+        )
+        query_vs30s = [vs30 for vs30 in vs30_list if vs30 in missing_vs30s]
+        query_imts = [imt for imt in imt_list if imt in missing_imts]
+        query_aggs = [agg for agg in agg_list if agg in missing_aggs]
+        log.info(f"{len(cached)} of {len(keys)} hazard curves found in {cache}")
+
+    if cached:
+        imtl_list = next(iter(cached.values()))[0]
+    else:
+        # call a location to get the imtls that are returned
+        res = next(
+            get_hazard_curves(
+                sites["latlon"][:1],
+                vs30_list[:1],
+                [hazard_id],
+                imt_list[:1],
+                agg_list[:1],
+            )
+        )
+        imtl_list = [float(val.lvl) for val in res.values]
 
     # initialize hcurves
     hcurves = -1 * np.ones(
         [len(vs30_list), len(sites), len(imt_list), len(imtl_list), len(agg_list)]
     )
 
+    # precompute the array index of each hazard parameter
+    site_indices = site_index_map(sites)
+    vs30_indices = first_index_map(vs30_list)
+    imt_indices = first_index_map(imt_list)
+    agg_indices = first_index_map(agg_list)
+
+    for (latlon, vs30, imt, agg), (_, values) in cached.items():
+        hcurves[
+            vs30_indices[vs30],
+            site_indices[latlon],
+            imt_indices[imt],
+            :,
+            agg_indices[agg],
+        ] = values
+
     log.info("Querying hazard curves...")
 
     # cycle through all hazard parameters
     count = 0
     CHUNK = 1000
     expected_count = (
-        len(sites["latlon"]) * len(vs30_list) * len(imt_list) * len(agg_list)
+        len(query_locs) * len(query_vs30s) * len(query_imts) * len(query_aggs)
     )
     timings = []
+    queried = {}
     t0 = dt.datetime.now()
-    for res in get_hazard_curves(
-        sites["latlon"], vs30_list, [hazard_id], imt_list, agg_list
+    for res in (
+        get_hazard_curves(query_locs, query_vs30s, [hazard_id], query_imts, query_aggs)
+        if expected_count
+        else []
     ):
         count += 1
         delta = dt.datetime.now() - t0
@@ -211,18 +302,26 @@ def retrieve_hazard_curves(
 
         lat = res.lat
         lon = res.lon
-        vs30 = res.vs30
-        imt = res.imt
-        agg = res.agg
 
-        i_site = np.where(sites["latlon"] == f"{lat:.3f}~{lon:.3f}")
-        i_vs30 = vs30_list.index(vs30)
-        i_imt = imt_list.index(imt)
-        i_agg = agg_list.index(agg)
-
-        hcurves[i_vs30, i_site, i_imt, :, i_agg] = [val.val for val in res.values]
+        latlon = f"{lat:.3f}~{lon:.3f}"
+        i_site = site_indices.get(latlon, [])
+        i_vs30 = vs30_indices[res.vs30]
+        i_imt = imt_indices[res.imt]
+        i_agg = agg_indices[res.agg]
+
+        values = [val.val for val in res.values]
+        hcurves[i_vs30, i_site, i_imt, :, i_agg] = values
+        if cache is not None:
+            queried[(latlon, res.vs30, res.imt, res.agg)] = (
+                [float(val.lvl) for val in res.values],
+                values,
+            )
         t0 = dt.datetime.now()
 
+    if cache is not None:
+        cache.put_curves(hazard_id, queried)
+        log.info(f"hazard curve cache stats: {cache.stats()}")
+
     # # identify any missing data and produce a warning
     site_list = list(sites.index)
 
@@ -2,6 +2,8 @@
 This module derives the PGA, Sa,s, Tc, and Td parameters from the NSHM hazard curves.
 """
 import logging
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
 from typing import TYPE_CHECKING, List, Optional, Tuple, Union
 
@@ -21,11 +23,13 @@ from nzssdt_2023.data_creation.constants import (
     VS30_LIST,
     LocationReplacement,
 )
-from nzssdt_2023.data_creation.extract_data import (
+from nzssdt_2023.data_creation.extract_data import (  # noqa: F401
+    HazardDataset,
     extract_APoEs,
     extract_quantiles,
     extract_sites,
     extract_spectra,
+    open_dataset,
 )
 from nzssdt_2023.data_creation.NSHM_to_hdf5 import acc_to_vel, g, period_from_imt
 
@@ -42,6 +46,9 @@ PGA_REDUCTION_ENABLED = (
 )
 PGA_ROUNDING_ENABLED = True  # for testing only, as above.
 
+TD_FIT_SITE_CHUNK_SIZE = 100
+"""Number of sites fit at once by `fit_Td_array`, which bounds the size of the Td error matrices."""
+
 
 def choose_site_class(vs30: Union[int, float], lower_bound: bool = False) -> str:
     """Returns the site class for the selected vs30 value
@@ -118,78 +125,116 @@ def acc_spectra_to_vel(acc_spectra: "npt.NDArray", imtls: dict) -> "npt.NDArray"
     return vel_spectra
 
 
-def calc_R_PGA(pga: float, site_class: str) -> float:
+def calc_R_PGA(
+    pga: Union[float, "npt.NDArray"], site_class: str
+) -> Union[float, "npt.NDArray"]:
     """Calculate the reduction factor for the peak ground acceleration (Eq. C3.15)
 
     Args:
-        pga: peak ground acceleration [g]
+        pga: peak ground acceleration(s) [g]
         site_class: roman numeral
 
     Returns:
-        r_pga: reduction factor for peak ground acceleration
-
+        r_pga: reduction factor(s) for peak ground acceleration
     """
-    r_pga = 0
+    pga = np.asarray(pga)
+    r_pga = np.zeros(pga.shape)
 
     if site_class in PGA_REDUCTIONS.keys():
         A0 = PGA_REDUCTIONS[site_class].A0
         A1 = PGA_REDUCTIONS[site_class].A1
         PGA_threshold = PGA_REDUCTIONS[site_class].PGA_threshold
 
-        if pga >= PGA_threshold:
-            r_pga = A0 * np.log(pga) + A1
+        # compare and scale in double precision, as for scalar (e.g. float32) pga values
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_pga = np.log(pga).astype(float)
+        r_pga = np.where(pga.astype(float) >= PGA_threshold, A0 * log_pga + A1, 0.0)
 
-    return r_pga
+    return r_pga[()]
 
 
-def calc_reduced_PGA(pga: float, site_class: str) -> float:
+def calc_reduced_PGA(
+    pga: Union[float, "npt.NDArray"], site_class: str
+) -> Union[float, "npt.NDArray"]:
     """Calculate the adjusted peak ground acceleration (Eq. C3.14)
 
     Args:
-        pga: peak ground acceleration [g]
+        pga: peak ground acceleration(s) [g]
         site_class: roman numeral
 
     Returns:
-        reduced_pga: adjusted peak ground acceleration
+        reduced_pga: adjusted peak ground acceleration(s)
     """
     r_pga = calc_R_PGA(pga, site_class)
-    reduced_pga = pga * (1 - r_pga)
+    reduced_pga = np.asarray(pga).astype(float) * (1 - r_pga)
 
-    return reduced_pga
+    return reduced_pga[()]
 
 
 def reduce_PGAs(PGA: "npt.NDArray") -> "npt.NDArray":
     """Apply peak ground acceleration adjustments to all PGA values (Eq. C3.14)
 
     Args:
-        PGA: peak ground acceleration
+        PGA: peak ground acceleration (dimensions: vs30, site, return period, statistic)
 
     Returns:
         reduced_PGA: adjusted peak ground acceleration
     """
-    n_vs30s, n_sites, n_rps, n_stats = PGA.shape
     reduced_PGA = PGA.copy()
 
     for sc in PGA_REDUCTIONS.keys():
         vs30 = int(SITE_CLASSES[sc].representative_vs30)
         i_vs30 = VS30_LIST.index(vs30)
-        for i_site in range(n_sites):
-            for i_rp in range(n_rps):
-                for i_stat in range(n_stats):
-                    pga = PGA[i_vs30, i_site, i_rp, i_stat]
-                    reduced_PGA[i_vs30, i_site, i_rp, i_stat] = calc_reduced_PGA(
-                        pga, sc
-                    )
+        reduced_PGA[i_vs30] = calc_reduced_PGA(PGA[i_vs30], sc)
 
     return reduced_PGA
 
 
+def uhs_values(
+    periods: Union[float, List[float], "npt.NDArray"],
+    PGA: Union[float, "npt.NDArray"],
+    Sas: Union[float, "npt.NDArray"],
+    Tc: Union[float, "npt.NDArray"],
+    Td: Union[float, "npt.NDArray"],
+) -> "npt.NDArray":
+    """Derive the spectral accelerations Sa(T) at the given periods (T), based on the seismic demand parameters.
+    Sa(T) equations come from TS Eq. 3.2-3.5
+
+    All arguments are broadcast against each other (as for a numpy ufunc), so many spectra can be
+    evaluated in one call, e.g. periods with shape (n_periods,) and parameters with shape (n_spectra, 1).
+
+    Args:
+        periods: periods, T, at which the spectral accelerations are calculated [seconds]
+        PGA: peak ground acceleration [g]
+        Sas: short-period spectral acceleration [g]
+        Tc: spectral-acceleration-plateau corner period [seconds]
+        Td: spectral-velocity-plateau corner period [seconds]
+
+    Returns:
+        SaT: spectral accelerations [g], with the broadcast shape of the arguments
+    """
+    periods = np.asarray(periods, dtype=float)
+    PGA, Sas, Tc, Td = (np.asarray(x) for x in (PGA, Sas, Tc, Td))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        velocity_plateau = Sas * Tc / periods
+        SaT: "npt.NDArray" = np.select(
+            [periods == 0, periods < 0.1, periods < Tc, periods < Td],
+            [PGA, PGA + (Sas - PGA) * (periods / 0.1), Sas, velocity_plateau],
+            velocity_plateau * np.sqrt(Td / periods),
+        )
+
+    return SaT
+
+
 def uhs_value(
     period: Union[float, "npt.NDArray"], PGA: float, Sas: float, Tc: float, Td: float
 ) -> float:
     """Derive the spectral acceleration Sa(T) at a given period (T), based on the seismic demand parameters.
     Sa(T) equations come from TS Eq. 3.2-3.5
 
+    This is the scalar form of `uhs_values`.
+
     Args:
         period: period, T, a which the spectral acceleration is calculated [seconds]
         PGA: peak ground acceleration [g]
@@ -197,12 +242,6 @@ def uhs_value(
         Tc: spectral-acceleration-plateau corner period [seconds]
         Td: spectral-velocity-plateau corner period [seconds]
 
-    Todo:
-        this works (i.e. it handles the code as it's called now) -  but
-        I think there's a better way to do this sort of thing whe your data is in numpy arrays
-        see: https://stackoverflow.com/questions/42594695/
-        how-to-apply-a-function-map-values-of-each-element-in-a-2d-numpy-array-matrix
-
     Returns:
         SaT: spectral acceleration [g]
     """
@@ -210,53 +249,88 @@ def uhs_value(
         assert len(period) == 1
         period = float(period[0])
 
-    if period == 0:
-        SaT = PGA
-    elif period < 0.1:
-        SaT = PGA + (Sas - PGA) * (period / 0.1)
-    elif period < Tc:
-        SaT = Sas
-    elif period < Td:
-        SaT = Sas * Tc / period
-    else:
-        SaT = Sas * Tc / period * (Td / period) ** 0.5
-
-    return float(SaT)
+    return float(uhs_values(period, PGA, Sas, Tc, Td))
 
 
 def interpolate_spectra(
-    spectra: "npt.NDArray", imtls: dict, dt: float = 0.1
+    spectra: "npt.NDArray",
+    imtls: dict,
+    dt: float = 0.1,
+    stats: Optional[List[int]] = None,
 ) -> Tuple["npt.NDArray", "npt.NDArray"]:
     """Linearly interpolate spectra over the original domain, in increments of dt
 
+    The interpolation brackets and offsets are the same for every spectrum, so they are
+    computed once and applied to all spectra as a single gather-and-multiply
+    (reproducing `np.interp`).
+
     Inputs:
         spectra: acceleration spectra
         imtls: keys: intensity measures e.g., SA(1.0), values: list of intensity levels
         dt: period increments at which to interpolate
+        stats: spectra indices for stats in ['mean'] + quantiles to interpolate (default: all)
 
     Returns:
-        new_spectra: interpolated spectra
+        new_spectra: interpolated spectra (only including the requested stats)
         new_period_list: periods at which the spectra are defined
     """
-    n_vs30s, n_sites, n_periods, n_apoes, n_stats = spectra.shape
+    if stats is not None:
+        spectra = spectra[..., stats]
 
     period_list = np.array([period_from_imt(imt) for imt in imtls.keys()])
     new_period_list = np.arange(min(period_list), max(period_list) + dt, dt)
 
-    new_spectra = np.zeros([n_vs30s, n_sites, len(new_period_list), n_apoes, n_stats])
-    for i_vs30 in range(n_vs30s):
-        for i_site in range(n_sites):
-            for i_apoe in range(n_apoes):
-                for i_stat in range(n_stats):
-                    new_spectra[i_vs30, i_site, :, i_apoe, i_stat] = np.interp(
-                        new_period_list,
-                        period_list,
-                        spectra[i_vs30, i_site, :, i_apoe, i_stat],
-                    )
+    # bracketing periods for each new period
+    n_periods = len(period_list)
+    i_lo = np.searchsorted(period_list, new_period_list, side="right") - 1
+    i_lo = np.clip(i_lo, 0, n_periods - 2)
+    offset = (new_period_list - period_list[i_lo])[:, np.newaxis, np.newaxis]
+    width = (period_list[i_lo + 1] - period_list[i_lo])[:, np.newaxis, np.newaxis]
+
+    # dimensions: vs30, site, period, apoe, stat
+    spectra = np.asarray(spectra, dtype=float)
+    lower = spectra[:, :, i_lo, :, :]
+    upper = spectra[:, :, i_lo + 1, :, :]
+    new_spectra = (upper - lower) / width * offset + lower
+
+    # values at or beyond the end of the original domain
+    new_spectra[:, :, new_period_list >= period_list[-1]] = spectra[:, :, -1:]
+    new_spectra[:, :, new_period_list < period_list[0]] = spectra[:, :, :1]
 
     return new_spectra, new_period_list
 
 
+def relevant_domain_indices(
+    periods: "npt.NDArray",
+    tc: Union[float, "npt.NDArray"],
+    inclusive: bool = False,
+) -> Tuple[Union[int, "npt.NDArray"], int]:
+    """Return the index bounds of the relevant domain for potential values of Td
+
+    Args:
+        periods:  periods as which spectrum is defined [seconds]
+        tc:       spectral-acceleration-plateau corner period(s) [seconds]
+        inclusive: if true, the range includes the tc+0.5 value
+                   (e.g. for Tc+0.5 = 0.75, 0.7 <= Td rather than 0.8 <= Td)
+
+    Returns:
+        min_idx: index of the first relevant period, with the same shape as tc
+        max_idx: index after the last relevant period
+    """
+    max_T = 6
+    max_idx = int(np.searchsorted(periods, max_T, side="right"))
+
+    min_T = np.asarray(tc, dtype=float) + 0.5
+    min_idx = np.searchsorted(periods, min_T)
+    if inclusive:
+        nearest = periods[np.minimum(min_idx, len(periods) - 1)]
+        min_idx = np.where(sig_figs(nearest, 2) > min_T, min_idx - 1, min_idx)
+
+    if min_idx.ndim == 0:
+        return int(min_idx), max_idx
+    return min_idx, max_idx
+
+
 def relevant_spectrum_domain(
     spectrum: "npt.NDArray", periods: "npt.NDArray", tc: float, inclusive: bool = False
 ) -> Tuple["npt.NDArray", "npt.NDArray"]:
@@ -273,14 +347,7 @@ def relevant_spectrum_domain(
         relevant_spectrum: spectrum over the relevant periods
         relevant_periods: periods included in the relevant domain
     """
-    max_T = 6
-    max_idx = np.searchsorted(periods, max_T, side="right")
-
-    min_T = tc + 0.5
-    min_idx = np.searchsorted(periods, min_T)
-    if (sig_figs(periods[min_idx], 2) > min_T) & inclusive:
-        periods[min_idx]
-        min_idx -= 1
+    min_idx, max_idx = relevant_domain_indices(periods, tc, inclusive)
 
     relevant_periods = periods[min_idx:max_idx]
     relevant_spectrum = spectrum[min_idx:max_idx]
@@ -311,9 +378,7 @@ def Td_fit_error(
     Returns:
         error: error term
     """
-    fitted_spectrum = np.array(
-        [uhs_value(period, pga, sas, tc, td) for period in relevant_periods]
-    )
+    fitted_spectrum = uhs_values(relevant_periods, pga, sas, tc, td)
     error_array = np.abs(relevant_spectrum - fitted_spectrum)
     error = np.sum(error_array**2)
     return error
@@ -348,6 +413,89 @@ def fit_Td(
     return td
 
 
+def Td_fit_error_matrix(
+    relevant_periods: "npt.NDArray",
+    relevant_spectra: "npt.NDArray",
+    pga: "npt.NDArray",
+    sas: "npt.NDArray",
+    tc: "npt.NDArray",
+) -> "npt.NDArray":
+    """Calculate the spectral fit error terms for every candidate td value of many spectra.
+    Each candidate td is one of the relevant periods, as in `fit_Td`.
+
+    Args:
+        relevant_periods: periods included in the relevant domain [seconds]
+        relevant_spectra: spectra over the relevant periods [g] (dimensions: spectrum, period)
+        pga: peak ground acceleration of each spectrum [g]
+        sas: short-period spectral acceleration of each spectrum [g]
+        tc: spectral-acceleration-plateau corner period of each spectrum [seconds]
+
+    Returns:
+        error: error terms (dimensions: spectrum, candidate td)
+    """
+    # dimensions: spectrum, candidate td, period
+    relevant_periods = np.asarray(relevant_periods)
+    fitted_spectra = uhs_values(
+        relevant_periods,
+        np.asarray(pga)[:, np.newaxis, np.newaxis],
+        np.asarray(sas)[:, np.newaxis, np.newaxis],
+        np.asarray(tc)[:, np.newaxis, np.newaxis],
+        relevant_periods[:, np.newaxis],
+    )
+
+    error_array = np.abs(relevant_spectra[:, np.newaxis, :] - fitted_spectra)
+    error: "npt.NDArray" = np.sum(error_array**2, axis=-1)
+    return error
+
+
+def fit_Td_spectra(
+    spectra: "npt.NDArray",
+    periods: "npt.NDArray",
+    PGA: "npt.NDArray",
+    Sas: "npt.NDArray",
+    Tc: "npt.NDArray",
+) -> "npt.NDArray":
+    """Fit the Td values to obtain the best fit over many response spectra at once
+
+    This is equivalent to calling `fit_Td` for each spectrum. Spectra that share the same
+    relevant domain are fit together with a single candidate-Td x period error matrix.
+
+    Args:
+        spectra: acceleration spectra [g], with the periods along the last axis
+        periods:  periods over which spectra are defined [seconds]
+        PGA: peak ground accelerations [g], with shape spectra.shape[:-1]
+        Sas: short-period spectral accelerations [g], with shape spectra.shape[:-1]
+        Tc: spectral-acceleration-plateau corner periods [seconds], with shape spectra.shape[:-1]
+
+    Returns:
+        Td: spectral-velocity-plateau corner periods [seconds], with shape spectra.shape[:-1]
+    """
+    shape = spectra.shape[:-1]
+    spectra = spectra.reshape(-1, spectra.shape[-1])
+    PGA = np.asarray(PGA).ravel()
+    Sas = np.asarray(Sas).ravel()
+    Tc = np.asarray(Tc).ravel()
+
+    Td = np.zeros(len(spectra))
+    min_idx, max_idx = relevant_domain_indices(periods, Tc)
+
+    for i_min in np.unique(min_idx):
+        idx = np.flatnonzero(min_idx == i_min)
+        relevant_periods = periods[i_min:max_idx]
+
+        # select period with the minimum error
+        td_error = Td_fit_error_matrix(
+            relevant_periods,
+            spectra[idx, i_min:max_idx],
+            PGA[idx],
+            Sas[idx],
+            Tc[idx],
+        )
+        Td[idx] = relevant_periods[np.argmin(td_error, axis=-1)]
+
+    return Td.reshape(shape)
+
+
 def fit_Td_array(
     PGA: "npt.NDArray",
     Sas: "npt.NDArray",
@@ -359,6 +507,7 @@ def fit_Td_array(
     hazard_rp_list: List[int],
     i_stat: int = 0,
     sites_of_interest: Optional[List[str]] = None,
+    site_chunk_size: Optional[int] = TD_FIT_SITE_CHUNK_SIZE,
 ) -> "npt.NDArray":
     """Fit the Td values for all sites, site classes and APoE of interest
 
@@ -373,6 +522,7 @@ def fit_Td_array(
         hazard_rp_list: return periods included in acc_spectra
         i_stat: spectra index for stats in ['mean'] + quantiles
         sites_of_interest: subset of sites
+        site_chunk_size: number of sites to fit at once, bounding the peak memory (None fits all sites at once)
 
     Returns:
         Td: spectral-velocity-plateau corner period [seconds]
@@ -380,46 +530,51 @@ def fit_Td_array(
     if sites_of_interest is None:
         sites_of_interest = site_list
 
-    interpolated_spectra, periods = interpolate_spectra(acc_spectra, imtls)
-    n_vs30s, _, n_periods, n_apoes, n_stats = interpolated_spectra.shape
-    n_sites = len(sites_of_interest)
+    site_idx = np.array([site_list.index(site) for site in sites_of_interest])
+    vs30_idx = np.array([vs30_list.index(vs30) for vs30 in vs30_list])
+    rp_idx = np.array([hazard_rp_list.index(rp) for rp in hazard_rp_list])
+
+    # only the sites and stat of interest are interpolated
+    interpolated_spectra, periods = interpolate_spectra(
+        acc_spectra[:, site_idx], imtls, stats=[i_stat]
+    )
+    n_vs30s, n_sites, n_periods, n_apoes, _ = interpolated_spectra.shape
     Td = np.zeros([n_vs30s, n_sites, n_apoes])
-    # print(type(Td))
+    site_chunk_size = site_chunk_size or n_sites
+
+    # dimensions: vs30, site, apoe, period
+    spectra = np.moveaxis(interpolated_spectra[..., 0], 2, -1)
 
-    # cycle through all hazard parameters
-    count = 0
-    expected_count = n_sites
-    for i_site_int, site in enumerate(sites_of_interest):
-        count += 1
+    for start in range(0, n_sites, site_chunk_size):
+        stop = min(start + site_chunk_size, n_sites)
         log.info(
-            f"fit_Td_array progress: Site #{count} of {expected_count}. "
-            f"Approx {(count / expected_count) * 100:.1f} % progress. "
+            f"fit_Td_array progress: Sites #{start + 1} to #{stop} of {n_sites}. "
+            f"Approx {(stop / n_sites) * 100:.1f} % progress. "
         )
 
-        for vs30 in vs30_list:
-            for rp in hazard_rp_list:
-                i_site = site_list.index(site)
-                i_vs30 = vs30_list.index(vs30)
-                i_rp = hazard_rp_list.index(rp)
-
-                spectrum = interpolated_spectra[i_vs30, i_site, :, i_rp, i_stat]
+        grid = np.ix_(vs30_idx, np.arange(start, stop), rp_idx)
+        parameter_grid = np.ix_(vs30_idx, site_idx[start:stop], rp_idx)
 
-                pga = PGA[i_vs30, i_site, i_rp, i_stat]
-                sas = Sas[i_vs30, i_site, i_rp, i_stat]
-                tc = Tc[i_vs30, i_site, i_rp, i_stat]
-
-                Td[i_vs30, i_site_int, i_rp] = fit_Td(spectrum, periods, pga, sas, tc)
+        Td[grid] = fit_Td_spectra(
+            spectra[grid],
+            periods,
+            PGA[..., i_stat][parameter_grid],
+            Sas[..., i_stat][parameter_grid],
+            Tc[..., i_stat][parameter_grid],
+        )
 
     return Td
 
 
 def calculate_parameter_arrays(
-    data_file: str | Path,
+    data_file: Union[str, Path, HazardDataset],
+    site_slice: Optional[slice] = None,
 ) -> Tuple["npt.NDArray", "npt.NDArray", "npt.NDArray", "npt.NDArray"]:
     """Calculate PGA, Sa,s, and Tc values for uniform hazard spectra in hdf5
 
     Args:
-        data_file: name of hazard hdf5 file
+        data_file: name of hazard hdf5 file, or an open dataset
+        site_slice: if given, only calculate the values for this range of sites
 
     Returns:
         PGA: adjusted peak ground acceleration [g] (Eqn C3.14)
@@ -428,7 +583,7 @@ def calculate_parameter_arrays(
         Tc : spectral-acceleration-plateau corner period [seconds]
     """
 
-    acc_spectra, imtls = extract_spectra(data_file)
+    acc_spectra, imtls = extract_spectra(data_file, site_slice)
     vel_spectra = acc_spectra_to_vel(acc_spectra, imtls)
 
     PGA = acc_spectra[:, :, IMT_LIST.index("PGA"), :, :]
@@ -458,6 +613,92 @@ def calculate_parameter_arrays(
     return PGA, Sas, PSV, Tc
 
 
+def calculate_mean_parameter_shard(
+    hf_path: Union[str, Path, HazardDataset],
+    site_slice: slice,
+    vs30_list: List[int],
+    hazard_rp_list: List[int],
+) -> Tuple["npt.NDArray", "npt.NDArray", "npt.NDArray", "npt.NDArray", "npt.NDArray"]:
+    """Calculate the mean PGA, Sa,s, PSV, Tc and Td values for a range of sites in the hdf5
+
+    Args:
+        hf_path: hdf5 filename containing the hazard data, or an open dataset
+        site_slice: the range of sites to process
+        vs30_list: vs30s included in the hdf5
+        hazard_rp_list: return periods included in the hdf5
+
+    Returns:
+        PGA, Sas, PSV, Tc: as returned by `calculate_parameter_arrays`
+        mean_Td: spectral-velocity-plateau corner period of the mean spectra [seconds]
+    """
+    with open_dataset(hf_path) as dataset:
+        site_list = list(dataset.sites.index)[site_slice]
+
+        PGA, Sas, PSV, Tc = calculate_parameter_arrays(dataset, site_slice)
+        acc_spectra, imtls = dataset.spectra(site_slice)
+        mean_Td = fit_Td_array(
+            PGA, Sas, Tc, acc_spectra, imtls, site_list, vs30_list, hazard_rp_list
+        )
+
+    return PGA, Sas, PSV, Tc, mean_Td
+
+
+def calculate_mean_parameter_arrays(
+    hf_path: Union[str, Path, HazardDataset],
+    n_sites: int,
+    vs30_list: List[int],
+    hazard_rp_list: List[int],
+    workers: int = 1,
+) -> Tuple["npt.NDArray", "npt.NDArray", "npt.NDArray", "npt.NDArray", "npt.NDArray"]:
+    """Calculate the mean PGA, Sa,s, PSV, Tc and Td values for all sites in the hdf5
+
+    Every site is independent, so with more than one worker the sites are split into
+    contiguous shards that are processed in a pool of processes, then merged in site order.
+    Each process reads its own shard of the hdf5.
+
+    Args:
+        hf_path: hdf5 filename containing the hazard data, or an open dataset
+        n_sites: number of sites in the hdf5
+        vs30_list: vs30s included in the hdf5
+        hazard_rp_list: return periods included in the hdf5
+        workers: number of processes to use
+
+    Returns:
+        PGA, Sas, PSV, Tc: as returned by `calculate_parameter_arrays`
+        mean_Td: spectral-velocity-plateau corner period of the mean spectra [seconds]
+    """
+    if workers <= 1:
+        return calculate_mean_parameter_shard(
+            hf_path, slice(None), vs30_list, hazard_rp_list
+        )
+
+    site_slices = [
+        slice(shard[0], shard[-1] + 1)
+        for shard in np.array_split(np.arange(n_sites), workers)
+        if len(shard)
+    ]
+    log.info(f"processing {n_sites} sites in {len(site_slices)} shards")
+
+    if isinstance(hf_path, HazardDataset):
+        hf_path = hf_path.data_file
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        shards = list(
+            executor.map(
+                calculate_mean_parameter_shard,
+                repeat(hf_path),
+                site_slices,
+                repeat(vs30_list),
+                repeat(hazard_rp_list),
+            )
+        )
+
+    PGA, Sas, PSV, Tc, mean_Td = (
+        np.concatenate(arrays, axis=1) for arrays in zip(*shards)
+    )
+    return PGA, Sas, PSV, Tc, mean_Td
+
+
 def create_mean_sa_table(
     PGA, Sas, PSV, Tc, mean_Td, site_list, vs30_list, hazard_rp_list
 ):
@@ -722,30 +963,34 @@ def replace_relevant_locations(
 #     return df
 
 
-def create_sa_table(hf_path: Path, lower_bound_flags: bool = True) -> "pdt.DataFrame":
+def create_sa_table(
+    hf_path: Union[Path, HazardDataset],
+    lower_bound_flags: bool = True,
+    workers: int = 1,
+) -> "pdt.DataFrame":
     """Creates a pandas dataframe with the sa parameters
 
     Args:
-        hf_path: hdf5 filename, containing the hazard data
+        hf_path: hdf5 filename containing the hazard data, or an open dataset
         lower_bound_flags: True includes the metadata for updating the lower bound hazard
+        workers: number of processes used for the (site independent) mean parameters
 
     Returns:
         df: dataframe of sa parameters
     """
-    site_list = list(extract_sites(hf_path).index)
-    APoEs, hazard_rp_list = extract_APoEs(hf_path)
-    quantile_list = extract_quantiles(hf_path)
     vs30_list = VS30_LIST
 
-    log.info("begin calculate_parameter_arrays")
-    PGA, Sas, PSV, Tc = calculate_parameter_arrays(hf_path)
+    with open_dataset(hf_path) as dataset:
+        site_list = list(dataset.sites.index)
+        hazard_rp_list = dataset.hazard_rps
+        quantile_list = dataset.quantiles
 
-    acc_spectra, imtls = extract_spectra(hf_path)
+        log.info("begin calculate_parameter_arrays and fit_Td_array for mean Tds")
+        PGA, Sas, PSV, Tc, mean_Td = calculate_mean_parameter_arrays(
+            dataset, len(site_list), vs30_list, hazard_rp_list, workers
+        )
 
-    log.info("begin fit_Td_array for mean Tds")
-    mean_Td = fit_Td_array(
-        PGA, Sas, Tc, acc_spectra, imtls, site_list, vs30_list, hazard_rp_list
-    )
+        acc_spectra, imtls = dataset.spectra()
 
     log.info("begin create_mean_sa_table")
     mean_df = create_mean_sa_table(
@@ -5,4 +5,5 @@ Modules:
  geospatial_analysis: map latitude and longitude to TS locations.
  query_parameters: query the TS seismic demand parameter tables.
  create_spectra: use TS parameters to produce acceleration spectra.
+ columnar_table: save and load the TS tables in a compact columnar format.
 """
@@ -0,0 +1,74 @@
+"""
+This module saves and loads the TS parameter tables in a compact columnar .npz format
+
+Each column is stored as a numpy array. String columns (e.g., Location and Site Class) are
+dictionary encoded as integer codes into an array of the unique strings, so the file is a
+fraction of the size of the .json tables and is loaded without any text parsing.
+"""
+
+from pathlib import Path
+from typing import TYPE_CHECKING, Union
+
+import numpy as np
+import pandas as pd
+
+if TYPE_CHECKING:
+    import pandas.typing as pdt
+
+COLUMNAR_FORMAT_VERSION = 1
+
+
+def save_columnar_table(table: "pdt.DataFrame", path: Union[str, Path]):
+    """Save a parameter table to a compressed columnar .npz
+
+    The index is not saved, the table is loaded with a default range index.
+
+    Args:
+        table: parameter table with string, numeric, or boolean columns
+        path: path to the .npz file
+    """
+
+    arrays = {
+        "format_version": np.array(COLUMNAR_FORMAT_VERSION),
+        "columns": np.array(table.columns, dtype=str),
+    }
+    for i, column in enumerate(table.columns):
+        values = table[column]
+        if values.dtype == object:
+            categories, codes = np.unique(
+                values.to_numpy(dtype=str), return_inverse=True
+            )
+            arrays[f"column_{i}_categories"] = categories
+            arrays[f"column_{i}"] = codes.astype(np.int32)
+        else:
+            arrays[f"column_{i}"] = values.to_numpy()
+
+    np.savez_compressed(Path(path), **arrays)
+
+
+def load_columnar_table(path: Union[str, Path]) -> "pdt.DataFrame":
+    """Load a parameter table from a columnar .npz
+
+    Args:
+        path: path to the .npz file
+
+    Returns:
+        table: the parameter table
+    """
+
+    with np.load(Path(path), allow_pickle=False) as arrays:
+        format_version = int(arrays["format_version"])
+        if format_version > COLUMNAR_FORMAT_VERSION:
+            raise ValueError(
+                f"{path} has columnar format version {format_version}, "
+                f"only versions up to {COLUMNAR_FORMAT_VERSION} can be read"
+            )
+
+        columns = {}
+        for i, column in enumerate(arrays["columns"].tolist()):
+            values = arrays[f"column_{i}"]
+            if f"column_{i}_categories" in arrays:
+                values = arrays[f"column_{i}_categories"].astype(object)[values]
+            columns[column] = values
+
+    return pd.DataFrame(columns)
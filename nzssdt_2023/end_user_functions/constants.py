@@ -8,9 +8,15 @@ Three constants are imported from other parts of the library:
     from nzssdt_2023.config import DELIVERABLES_FOLDER, RESOURCES_FOLDER
 
     from nzssdt_2023.data_creation.constants import DEFAULT_RPS, SITE_CLASSES
+
+The parameter tables and geometries are read on first use by their accessors, e.g.
+`get_parameter_table()`, and cached. The former module attributes, e.g. `PARAMETER_TABLE`,
+are still available and call the accessors.
 """
 
+from functools import lru_cache
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import geopandas as gpd
 import numpy as np
@@ -18,6 +24,11 @@ import pandas as pd
 
 from nzssdt_2023.config import DELIVERABLES_FOLDER, RESOURCES_FOLDER
 from nzssdt_2023.data_creation.constants import DEFAULT_RPS, SITE_CLASSES
+from nzssdt_2023.end_user_functions.columnar_table import load_columnar_table
+
+if TYPE_CHECKING:
+    import geopandas.typing as gpdt
+    import pandas.typing as pdt
 
 TS_VERSION = "v2"
 SNZ_NAME_PREFIX = "TS1170-5"
@@ -30,6 +41,9 @@ NAMED_PARAMETERS_PATH = Path(
 GRID_PARAMETERS_PATH = Path(
     DELIVERABLES_VERSION, f"{SNZ_NAME_PREFIX}_Table3-2_{PUBLICATION_YEAR}.json"
 )
+# columnar versions of the parameter tables, used instead of the .json when present
+NAMED_PARAMETERS_NPZ_PATH = NAMED_PARAMETERS_PATH.with_suffix(".npz")
+GRID_PARAMETERS_NPZ_PATH = GRID_PARAMETERS_PATH.with_suffix(".npz")
 POLYGONS_PATH = Path(
     DELIVERABLES_VERSION,
     f"{SNZ_NAME_PREFIX}_Figure3-2_{PUBLICATION_YEAR}.geojson",
@@ -41,15 +55,11 @@ FAULTS_PATH = Path(
     DELIVERABLES_VERSION, f"{SNZ_NAME_PREFIX}_MajorFaults_{PUBLICATION_YEAR}.geojson"
 )
 NZ_MAP_PATH = Path(RESOURCES_FOLDER, "end_user_functions", "nz_map.geojson")
-
-
-NAMED_PARAMETER_TABLE = pd.read_json(
-    NAMED_PARAMETERS_PATH, orient="table", precise_float=True
+# optional precomputed spectra of every line of the parameter tables at DEFAULT_PERIODS
+SPECTRA_TABLE_PATH = Path(
+    DELIVERABLES_VERSION, f"{SNZ_NAME_PREFIX}_Spectra_{PUBLICATION_YEAR}.npz"
 )
-GRID_PARAMETER_TABLE = pd.read_json(
-    GRID_PARAMETERS_PATH, orient="table", precise_float=True
-)
-PARAMETER_TABLE = pd.concat([NAMED_PARAMETER_TABLE, GRID_PARAMETER_TABLE], axis=0)
+
 
 APOE_NS = DEFAULT_RPS
 APOES = [f"1/{n}" for n in APOE_NS]
@@ -61,7 +71,76 @@ APOE_N_THRESHOLD_FOR_D = 500
 DEFAULT_PERIODS = list(np.arange(0, 3 + 0.01, 0.01)) + [3.5, 4, 4.5, 5, 6, 7, 8, 9, 10]
 
 
-POLYGONS = gpd.read_file(POLYGONS_PATH).set_index("Name")
-GRID_PTS = gpd.read_file(GRID_POINTS_PATH).set_index("Name")
-FAULTS = gpd.read_file(FAULTS_PATH)
-NZ_MAP = gpd.read_file(NZ_MAP_PATH)
+def read_parameter_table(json_path: Path, npz_path: Path) -> "pdt.DataFrame":
+    """Read a TS parameter table, from the columnar .npz if present, otherwise the .json
+
+    Args:
+        json_path: path to the .json table
+        npz_path: path to the columnar .npz table
+
+    Returns:
+        table: the parameter table
+    """
+    if npz_path.exists():
+        return load_columnar_table(npz_path)
+    return pd.read_json(json_path, orient="table", precise_float=True)
+
+
+@lru_cache(maxsize=None)
+def get_named_parameter_table() -> "pdt.DataFrame":
+    """TS parameter table of the named locations (Table 3.1)"""
+    return read_parameter_table(NAMED_PARAMETERS_PATH, NAMED_PARAMETERS_NPZ_PATH)
+
+
+@lru_cache(maxsize=None)
+def get_grid_parameter_table() -> "pdt.DataFrame":
+    """TS parameter table of the grid locations (Table 3.2)"""
+    return read_parameter_table(GRID_PARAMETERS_PATH, GRID_PARAMETERS_NPZ_PATH)
+
+
+@lru_cache(maxsize=None)
+def get_parameter_table() -> "pdt.DataFrame":
+    """TS parameter table of the named and grid locations"""
+    return pd.concat([get_named_parameter_table(), get_grid_parameter_table()], axis=0)
+
+
+@lru_cache(maxsize=None)
+def get_polygons() -> "gpdt.DataFrame":
+    """polygons of the named locations, indexed by name"""
+    return gpd.read_file(POLYGONS_PATH).set_index("Name")
+
+
+@lru_cache(maxsize=None)
+def get_grid_points() -> "gpdt.DataFrame":
+    """grid points, indexed by name"""
+    return gpd.read_file(GRID_POINTS_PATH).set_index("Name")
+
+
+@lru_cache(maxsize=None)
+def get_faults() -> "gpdt.DataFrame":
+    """major fault lines"""
+    return gpd.read_file(FAULTS_PATH)
+
+
+@lru_cache(maxsize=None)
+def get_nz_map() -> "gpdt.DataFrame":
+    """New Zealand land polygons"""
+    return gpd.read_file(NZ_MAP_PATH)
+
+
+_LAZY_CONSTANTS = {
+    "NAMED_PARAMETER_TABLE": get_named_parameter_table,
+    "GRID_PARAMETER_TABLE": get_grid_parameter_table,
+    "PARAMETER_TABLE": get_parameter_table,
+    "POLYGONS": get_polygons,
+    "GRID_PTS": get_grid_points,
+    "FAULTS": get_faults,
+    "NZ_MAP": get_nz_map,
+}
+
+
+def __getattr__(name: str):
+    # the former module constants are loaded when first accessed
+    if name in _LAZY_CONSTANTS:
+        return _LAZY_CONSTANTS[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -2,18 +2,296 @@
 This module contains end user functions for creating the TS spectra from the tabulated parameters
 """
 
-from typing import TYPE_CHECKING, List
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Tuple, Union
 
 import numpy as np
 import pandas as pd
 
-from nzssdt_2023.data_creation.sa_parameter_generation import uhs_value
-from nzssdt_2023.end_user_functions.constants import DEFAULT_PERIODS
-from nzssdt_2023.end_user_functions.query_parameters import retrieve_sa_parameters
+from nzssdt_2023.data_creation.sa_parameter_generation import uhs_values
+from nzssdt_2023.end_user_functions.constants import (
+    DEFAULT_PERIODS,
+    SA_PARAMETER_NAMES,
+    SPECTRA_TABLE_PATH,
+)
+from nzssdt_2023.end_user_functions.query_parameters import (
+    TABLE_KEY_NAMES,
+    retrieve_sa_parameters_many,
+)
 
 if TYPE_CHECKING:
+    import numpy.typing as npt
     import pandas.typing as pdt
 
+SPECTRUM_CACHE_SIZE = 4096
+"""maximum number of spectra kept by the spectrum cache"""
+
+SpectrumKey = Tuple[float, float, float, float, bytes, int]
+"""(pga, sas, tc, td, hash of the periods, precision) of a spectrum"""
+
+
+class SpectrumCache:
+    """A bounded least-recently-used cache of TS spectra, with hit and miss statistics
+
+    The spectra are keyed by their parameters, a hash of the period grid, and the
+    precision. The cached spectra are read-only arrays because they are shared by every
+    caller. The cache can be shared by threads.
+
+    Examples:
+        >>> cache = SpectrumCache(maxsize=1000)
+        >>> spectra = cache.spectra([[0.77, 1.71, 0.66, 2.6]], DEFAULT_PERIODS, 3)
+        >>> cache.stats()
+        {'hits': 0, 'misses': 1, 'entries': 1, 'maxsize': 1000, 'hit_rate': 0.0}
+    """
+
+    def __init__(self, maxsize: int = SPECTRUM_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._spectra: "OrderedDict[SpectrumKey, npt.NDArray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def spectra(
+        self, parameters: "npt.ArrayLike", periods: List[float], precision: int
+    ) -> "npt.NDArray":
+        """The spectra of many parameter sets, only the spectra not in the cache are evaluated
+
+        Args:
+            parameters: pga, sas, tc, and td (last dimension) of each spectrum
+            periods: list of periods [seconds] at which to calculate the spectra
+            precision: number of decimals to include in output
+
+        Returns:
+            spectra: read-only acceleration spectra [g], with the periods as the last dimension
+        """
+        parameter_array = np.asarray(parameters, dtype=float)
+        period_array = np.asarray(periods, dtype=float)
+        periods_hash = hashlib.blake2b(period_array.tobytes(), digest_size=16).digest()
+        keys = [
+            (pga, sas, tc, td, periods_hash, precision)
+            for pga, sas, tc, td in parameter_array.reshape(-1, 4).tolist()
+        ]
+
+        found = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                if key in self._spectra:
+                    self._spectra.move_to_end(key)
+                    found[key] = self._spectra[key]
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+
+        # evaluate the missing spectra together
+        if missing:
+            pga, sas, tc, td = np.array([key[:4] for key in missing]).T[..., np.newaxis]
+            new_spectra = uhs_values(period_array, pga, sas, tc, td).round(precision)
+            new_spectra.setflags(write=False)
+            found.update(zip(missing, new_spectra))
+
+        missing_keys = set(missing)
+        n_hits = sum(key not in missing_keys for key in keys)
+        with self._lock:
+            self.hits += n_hits
+            self.misses += len(keys) - n_hits
+            for key in missing:
+                self._spectra[key] = found[key]
+            while len(self._spectra) > self.maxsize:
+                self._spectra.popitem(last=False)
+
+        spectra = np.array([found[key] for key in keys]).reshape(
+            parameter_array.shape[:-1] + period_array.shape
+        )
+        spectra.setflags(write=False)
+        return spectra
+
+    def clear(self):
+        """Remove all spectra and reset the statistics"""
+        with self._lock:
+            self._spectra.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, float]:
+        """The cache hits and misses since the cache was created or cleared, and the number of cached spectra"""
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._spectra),
+                "maxsize": self.maxsize,
+                "hit_rate": self.hits / requests if requests else 0.0,
+            }
+
+
+SPECTRUM_CACHE = SpectrumCache()
+"""the spectrum cache shared by the spectra functions"""
+
+SPECTRA_TABLE_FORMAT_VERSION = 1
+
+
+class SpectraTable(NamedTuple):
+    """precomputed spectra, keyed by (Location, APoE (1/n), Site Class)
+
+    Each key indexes (through `spectrum_idx`) one of the unique float32 `spectra`,
+    evaluated at `periods` and rounded to `precision` decimals.
+    """
+
+    keys: pd.MultiIndex
+    spectrum_idx: "npt.NDArray"
+    spectra: "npt.NDArray"
+    periods: "npt.NDArray"
+    precision: int
+
+
+def save_spectra_table(
+    parameter_table: "pdt.DataFrame",
+    path: Union[str, Path],
+    periods: List[float] = DEFAULT_PERIODS,
+    precision: int = 3,
+):
+    """Evaluate the spectrum of every line of a TS parameter table and save them to a compressed .npz
+
+    Lines with the same parameters share one float32 spectrum. If a line is repeated in
+    the table, the first is kept.
+
+    Args:
+        parameter_table: TS parameter table
+        path: path to the .npz file
+        periods: list of periods [seconds] at which to calculate the spectra
+        precision: number of decimals to include in the spectra
+    """
+
+    keys = parameter_table[TABLE_KEY_NAMES]
+    first = ~keys.duplicated().to_numpy()
+    keys = keys[first]
+    parameters = parameter_table[SA_PARAMETER_NAMES].to_numpy(dtype=float)[first]
+
+    unique_parameters, spectrum_idx = np.unique(parameters, axis=0, return_inverse=True)
+    pga, sas, tc, td = unique_parameters.T[..., np.newaxis]
+    spectra = uhs_values(periods, pga, sas, tc, td).round(precision)
+
+    locations, location_codes = np.unique(
+        keys["Location"].to_numpy(dtype=str), return_inverse=True
+    )
+    site_classes, site_class_codes = np.unique(
+        keys["Site Class"].to_numpy(dtype=str), return_inverse=True
+    )
+    np.savez_compressed(
+        Path(path),
+        format_version=np.array(SPECTRA_TABLE_FORMAT_VERSION),
+        locations=locations,
+        location_codes=location_codes.astype(np.int32),
+        apoe_ns=keys["APoE (1/n)"].to_numpy(),
+        site_classes=site_classes,
+        site_class_codes=site_class_codes.astype(np.int8),
+        spectrum_idx=spectrum_idx.ravel().astype(np.int32),
+        spectra=spectra.astype(np.float32),
+        periods=np.asarray(periods, dtype=float),
+        precision=np.array(precision),
+    )
+
+
+def load_spectra_table(path: Union[str, Path]) -> SpectraTable:
+    """Load a table of precomputed spectra
+
+    Args:
+        path: path to the .npz file
+
+    Returns:
+        spectra_table: the table keys, the spectrum of each key, and the unique spectra
+    """
+
+    with np.load(Path(path), allow_pickle=False) as arrays:
+        format_version = int(arrays["format_version"])
+        if format_version > SPECTRA_TABLE_FORMAT_VERSION:
+            raise ValueError(
+                f"{path} has spectra table format version {format_version}, "
+                f"only versions up to {SPECTRA_TABLE_FORMAT_VERSION} can be read"
+            )
+
+        keys = pd.MultiIndex.from_arrays(
+            [
+                arrays["locations"].astype(object)[arrays["location_codes"]],
+                arrays["apoe_ns"],
+                arrays["site_classes"].astype(object)[arrays["site_class_codes"]],
+            ],
+            names=TABLE_KEY_NAMES,
+        )
+        spectra = arrays["spectra"]
+        spectra.setflags(write=False)
+
+        return SpectraTable(
+            keys,
+            arrays["spectrum_idx"],
+            spectra,
+            arrays["periods"],
+            int(arrays["precision"]),
+        )
+
+
+@lru_cache(maxsize=None)
+def get_spectra_table() -> Optional[SpectraTable]:
+    """The precomputed spectra of the TS tables, loaded on first use
+
+    Returns:
+        spectra_table: the precomputed spectra, or None if they have not been built
+    """
+    if not SPECTRA_TABLE_PATH.exists():
+        return None
+    return load_spectra_table(SPECTRA_TABLE_PATH)
+
+
+def lookup_spectra(
+    spectra_table: Optional[SpectraTable],
+    location_ids: "npt.ArrayLike",
+    apoe_ns: "npt.ArrayLike",
+    site_classes: "npt.ArrayLike",
+    periods: List[float],
+    precision: int,
+) -> Optional["npt.NDArray"]:
+    """Look up precomputed spectra, the arguments are broadcast against each other
+
+    Args:
+        spectra_table: the precomputed spectra
+        location_ids: labels for TS locations (e.g., 'Wellington' or '-47.3~167.8')
+        apoe_ns: shorthand for APoE (1/n)
+        site_classes: TS site class labels (e.g., 'IV')
+        periods: list of periods [seconds] of the spectra
+        precision: number of decimals of the spectra
+
+    Returns:
+        spectra: acceleration spectra [g] with the periods as the last dimension, or None if
+            the table does not have every spectrum at these periods and precision
+    """
+    if (
+        spectra_table is None
+        or spectra_table.precision != precision
+        or not np.array_equal(spectra_table.periods, np.asarray(periods, dtype=float))
+    ):
+        return None
+
+    location_ids, apoe_ns, site_classes = np.broadcast_arrays(
+        np.asarray(location_ids, dtype=object),
+        np.asarray(apoe_ns),
+        np.asarray(site_classes, dtype=object),
+    )
+    rows = spectra_table.keys.get_indexer(
+        pd.MultiIndex.from_arrays(
+            [location_ids.ravel(), apoe_ns.ravel(), site_classes.ravel()]
+        )
+    )
+    if np.any(rows < 0):
+        return None
+
+    # rounding again recovers the float64 values of the rounded float32 spectra
+    spectra = spectra_table.spectra[spectra_table.spectrum_idx[rows]]
+    spectra = spectra.astype(float).round(precision)
+    return spectra.reshape(location_ids.shape + spectra_table.periods.shape)
+
 
 def create_spectrum_from_parameters(
     pga: float,
@@ -37,9 +315,7 @@ def create_spectrum_from_parameters(
         spectrum: acceleration spectrum [g] calculated at the incoming list of periods
     """
 
-    spectrum = np.array(
-        [uhs_value(period, pga, sas, tc, td) for period in periods]
-    ).round(precision)
+    spectrum = SPECTRUM_CACHE.spectra([[pga, sas, tc, td]], periods, precision)[0]
 
     return list(spectrum)
 
@@ -65,14 +341,63 @@ def create_enveloped_spectra(
 
     """
 
-    df = pd.DataFrame()
-    df["Period"] = periods
+    spectra, envelopes = create_spectra_many(
+        [location_id], [apoe_n], site_class_list, periods, precision
+    )
 
-    for sc in site_class_list:
-        pga, sas, tc, td = retrieve_sa_parameters(location_id, apoe_n, sc)
-        df[sc] = create_spectrum_from_parameters(pga, sas, tc, td, periods, precision)
-
-    df["Envelope"] = np.max(df.loc[:, df.columns != "Period"], axis=1)
-    enveloped_spectra = df.round(precision)
+    columns = {"Period": periods}
+    columns.update(zip(site_class_list, spectra[0]))
+    columns["Envelope"] = envelopes[0]
+    enveloped_spectra = pd.DataFrame(columns).round(precision)
 
     return enveloped_spectra
+
+
+def create_spectra_many(
+    location_ids: List[str],
+    apoe_ns: List[int],
+    site_class_list: List[str],
+    periods: List[float] = DEFAULT_PERIODS,
+    precision: int = 3,
+) -> Tuple["npt.NDArray", "npt.NDArray"]:
+    """Creates the site class spectra and their envelopes for many location_ids and APoEs
+
+    The spectra are sliced from the precomputed spectra table when it has been built for
+    these periods and precision. Otherwise the TS parameters of all requests are retrieved
+    in one lookup and the spectra are evaluated together.
+
+    Args:
+        location_ids: labels for TS locations (e.g., ['Wellington', '-47.3~167.8']), one per request
+        apoe_ns: shorthand for APoE (1/n), one per request
+        site_class_list: list of TS site class labels (e.g., ['III',IV']), for every request
+        periods: list of periods [seconds] at which to calculate the spectra
+        precision: number of decimals to include in output
+
+    Returns:
+        spectra: read-only acceleration spectra [g] (dimensions: request, site class, period)
+        envelopes: read-only envelope of the site class spectra [g] (dimensions: request, period)
+    """
+
+    location_array = np.asarray(location_ids, dtype=object)[:, np.newaxis]
+    apoe_array = np.asarray(apoe_ns)[:, np.newaxis]
+    site_class_array = np.asarray(site_class_list, dtype=object)[np.newaxis, :]
+
+    spectra = lookup_spectra(
+        get_spectra_table(),
+        location_array,
+        apoe_array,
+        site_class_array,
+        periods,
+        precision,
+    )
+    if spectra is None:
+        parameters = retrieve_sa_parameters_many(
+            location_array, apoe_array, site_class_array
+        )
+        spectra = SPECTRUM_CACHE.spectra(parameters, periods, precision)
+    else:
+        spectra.setflags(write=False)
+    envelopes = spectra.max(axis=1)
+    envelopes.setflags(write=False)
+
+    return spectra, envelopes
@@ -2,11 +2,57 @@
 This module contains end user functions for spatially identifying the relevant TS row and distance calculations
 """
 
+from functools import lru_cache
+from typing import TYPE_CHECKING, List
+
 import geopandas as gpd
 import numpy as np
-from shapely.geometry import Point
+import shapely
+from shapely import STRtree
+
+from nzssdt_2023.end_user_functions.constants import (
+    get_faults,
+    get_grid_points,
+    get_nz_map,
+    get_polygons,
+)
+
+if TYPE_CHECKING:
+    import numpy.typing as npt
+
+NZTM_EPSG = 2193
+
+GRID_DISTANCE_DECIMALS = 4
+"""grid distances (in degrees) are rounded before the closest grid point is chosen"""
+
+
+@lru_cache(maxsize=None)
+def nz_map_index() -> STRtree:
+    """Spatial index of the New Zealand land polygons, built on first use"""
+    return STRtree(get_nz_map().geometry.to_numpy())
+
+
+@lru_cache(maxsize=None)
+def polygon_index() -> STRtree:
+    """Spatial index of the named location polygons, built on first use"""
+    return STRtree(get_polygons().geometry.to_numpy())
 
-from nzssdt_2023.end_user_functions.constants import FAULTS, GRID_PTS, NZ_MAP, POLYGONS
+
+@lru_cache(maxsize=None)
+def grid_index() -> STRtree:
+    """Spatial index of the grid points, built on first use"""
+    return STRtree(get_grid_points().geometry.to_numpy())
+
+
+@lru_cache(maxsize=None)
+def nztm_fault_index() -> STRtree:
+    """Spatial index of the faults projected to NZTM, built on first use
+
+    Returns:
+        tree: STRtree of the fault lines in NZTM coordinates
+    """
+    faults_nztm = get_faults().to_crs(epsg=NZTM_EPSG)
+    return STRtree(faults_nztm.geometry.to_numpy())
 
 
 def identify_location_id(longitude: float, latitude: float) -> str:
@@ -19,35 +65,72 @@ def identify_location_id(longitude: float, latitude: float) -> str:
     Returns:
         location_id: name of the relevant TS location
     """
+    return identify_location_ids([longitude], [latitude])[0]
+
+
+def identify_location_ids(
+    longitudes: "npt.ArrayLike", latitudes: "npt.ArrayLike"
+) -> List[str]:
+    """Identifies the TS locations assigned to many latitudes and longitudes
+
+    Points within a named location polygon are assigned that location, other points
+    within New Zealand are assigned the closest grid point. Equidistant grid points
+    are ordered by northwest, NE, SW, SE and the first is taken.
+
+    Args:
+        longitudes: longitudes of the points of interest
+        latitudes: latitudes of the points of interest
+
+    Returns:
+        location_ids: names of the relevant TS locations
+    """
+    points = shapely.points(np.asarray(longitudes), np.asarray(latitudes))
+    location_ids = np.full(len(points), "outside NZ", dtype=object)
 
-    # check whether point falls within New Zealand
-    if sum(NZ_MAP.contains(Point(longitude, latitude))) > 0:
+    # check whether points fall within New Zealand
+    in_nz = np.zeros(len(points), dtype=bool)
+    in_nz[nz_map_index().query(points, predicate="within")[0]] = True
 
-        # identify polygons that the point falls within
-        point_location = Point(longitude, latitude)
-        within_idx = POLYGONS.contains(point_location)
+    # identify polygons that the points fall within
+    point_idx, polygon_idx = polygon_index().query(points[in_nz], predicate="within")
+    point_idx = np.flatnonzero(in_nz)[point_idx]
+    # confirm that each point only falls in one polygon
+    assert len(np.unique(point_idx)) == len(
+        point_idx
+    ), "Point falls within more than one polygon"
+    location_ids[point_idx] = get_polygons().index[polygon_idx]
 
-        # if point falls in a polygon
-        if sum(within_idx) > 0:
-            # confirm that it only falls in one polygon
-            assert sum(within_idx) == 1, "Point falls within more than one polygon"
-            location_id = POLYGONS[within_idx].index[0]
+    # points that do not fall in a polygon snap to the closest grid point
+    in_grid = in_nz.copy()
+    in_grid[point_idx] = False
+    if in_grid.any():
+        location_ids[in_grid] = get_grid_points().index[
+            _closest_grid_points(points[in_grid])
+        ]
 
-        # if point does not fall in a polygon
-        else:
-            # calculate distance to all grid points
-            grid_dist = GRID_PTS.geometry.apply(
-                lambda x: point_location.distance(x)
-            ).round(4)
-            # find the closest locations (ordered by northwest, NE, SW, SE)
-            closest_idx = np.where(grid_dist == grid_dist.min())[0]
-            # for equidistant points, take the first
-            location_id = GRID_PTS.index[closest_idx[0]]
+    return location_ids.tolist()
 
-    else:
-        location_id = "outside NZ"
 
-    return location_id
+def _closest_grid_points(points: "npt.NDArray") -> "npt.NDArray":
+    """The index of the closest grid point to each point, taking the first of equidistant points
+
+    Only the grid points within rounding distance of the nearest one are compared.
+    """
+    _, nearest_distances = grid_index().query_nearest(
+        points, return_distance=True, all_matches=False
+    )
+    margin = 2 * 10.0**-GRID_DISTANCE_DECIMALS
+    point_idx, grid_idx = grid_index().query(
+        points, predicate="dwithin", distance=nearest_distances + margin
+    )
+    grid_dist = shapely.distance(points[point_idx], grid_index().geometries[grid_idx])
+    grid_dist = np.round(grid_dist, GRID_DISTANCE_DECIMALS)
+
+    # order by point, then rounded distance, then grid order and take the first of each point
+    order = np.lexsort((grid_idx, grid_dist, point_idx))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = point_idx[order][1:] != point_idx[order][:-1]
+    return grid_idx[order][first]
 
 
 def calculate_distance_to_fault(longitude: float, latitude: float) -> float:
@@ -60,16 +143,34 @@ def calculate_distance_to_fault(longitude: float, latitude: float) -> float:
     Returns:
         d: distance to fault, rounded to nearest kilometre
     """
-    point_location = Point(longitude, latitude)
-    latlon = gpd.GeoDataFrame(geometry=[point_location], crs="EPSG:4326")
+    return calculate_distances_to_fault([longitude], [latitude])[0]
+
+
+def calculate_distances_to_fault(
+    longitudes: "npt.ArrayLike", latitudes: "npt.ArrayLike"
+) -> "npt.NDArray":
+    """Calculates the distances from many latitude and longitude points to the nearest fault
+
+    The points are projected to NZTM together and matched to their nearest fault with
+    the spatial index of the faults.
+
+    Args:
+        longitudes: longitudes of the points of interest
+        latitudes: latitudes of the points of interest
+
+    Returns:
+        d: distances to fault, rounded to nearest kilometre
+    """
+    points = gpd.points_from_xy(longitudes, latitudes, crs="EPSG:4326")
 
     # convert to NZTM for distance calcs
-    latlon_nztm = latlon.to_crs(epsg=2193)
-    faults_nztm = FAULTS.to_crs(epsg=2193)
+    points_nztm = points.to_crs(epsg=NZTM_EPSG)
 
     # calculate minimum distance to fault
-    d = round(
-        latlon_nztm.geometry.apply(lambda x: faults_nztm.distance(x).min()) / 1000.0
+    (point_idx, _), distances = nztm_fault_index().query_nearest(
+        np.asarray(points_nztm), return_distance=True, all_matches=False
     )
+    d = np.empty(len(points_nztm))
+    d[point_idx] = distances
 
-    return d[0]
+    return np.round(d / 1000.0)
@@ -2,7 +2,8 @@
 This module contains end user functions for querying the TS table
 """
 
-from typing import TYPE_CHECKING, Tuple
+from functools import lru_cache
+from typing import TYPE_CHECKING, NamedTuple, Tuple
 
 import numpy as np
 import pandas as pd
@@ -11,14 +12,74 @@ from nzssdt_2023.end_user_functions.constants import (
     APOE_N_THRESHOLD_FOR_D,
     APOE_NS,
     APOES,
-    PARAMETER_TABLE,
     SA_PARAMETER_NAMES,
     SITE_CLASSES_LIST,
+    get_parameter_table,
 )
 
 if TYPE_CHECKING:
+    import numpy.typing as npt
     import pandas.typing as pdt
 
+MD_PARAMETER_NAMES = ["M", "D"]
+TABLE_KEY_NAMES = ["Location", "APoE (1/n)", "Site Class"]
+
+
+class IndexedParameterTable(NamedTuple):
+    """the TS parameter table as a (Location, APoE (1/n), Site Class) index of its lines
+
+    Row i of `sa_values` (PGA, Sas, Tc, Td) and `md_values` (M, D) belongs to `keys[i]`.
+    """
+
+    keys: pd.MultiIndex
+    sa_values: "npt.NDArray"
+    md_values: "npt.NDArray"
+
+
+@lru_cache(maxsize=None)
+def get_indexed_parameter_table() -> IndexedParameterTable:
+    """The TS parameter table indexed by (Location, APoE (1/n), Site Class), built on first use
+
+    If a line is repeated in the table, the first is kept.
+
+    Returns:
+        indexed_table: the table keys, and arrays of the sa and md parameters in the same row order
+    """
+    parameter_table = get_parameter_table()
+    keys = pd.MultiIndex.from_frame(parameter_table[TABLE_KEY_NAMES])
+    first = ~keys.duplicated()
+    return IndexedParameterTable(
+        keys[first],
+        parameter_table[SA_PARAMETER_NAMES].to_numpy(dtype=float)[first],
+        parameter_table[MD_PARAMETER_NAMES].to_numpy(dtype=float)[first],
+    )
+
+
+def _table_rows(
+    location_ids: "npt.ArrayLike",
+    apoe_ns: "npt.ArrayLike",
+    site_classes: "npt.ArrayLike",
+) -> "npt.NDArray":
+    """row numbers of the TS table lines in the indexed table"""
+    location_ids, apoe_ns, site_classes = np.broadcast_arrays(
+        np.asarray(location_ids, dtype=object),
+        np.asarray(apoe_ns),
+        np.asarray(site_classes, dtype=object),
+    )
+    rows = get_indexed_parameter_table().keys.get_indexer(
+        pd.MultiIndex.from_arrays(
+            [location_ids.ravel(), apoe_ns.ravel(), site_classes.ravel()]
+        )
+    )
+
+    missing = rows < 0
+    if missing.any():
+        raise KeyError(
+            "no TS table line for (location_id, apoe_n, site_class): "
+            f"{list(zip(location_ids.ravel()[missing], apoe_ns.ravel()[missing], site_classes.ravel()[missing]))}"
+        )
+    return rows.reshape(location_ids.shape)
+
 
 def retrieve_sa_parameters(
     location_id: str, apoe_n: int, site_class: str
@@ -37,16 +98,35 @@ def retrieve_sa_parameters(
         td: spectral-velocity-plateau corner period
     """
 
-    loc_idx = PARAMETER_TABLE["Location"] == location_id
-    apoe_idx = PARAMETER_TABLE["APoE (1/n)"] == apoe_n
-    sc_idx = PARAMETER_TABLE["Site Class"] == site_class
-
-    idx = loc_idx & apoe_idx & sc_idx
-    pga, sas, tc, td = PARAMETER_TABLE[idx][SA_PARAMETER_NAMES].iloc[0]
+    row = _table_rows([location_id], [apoe_n], [site_class])[0]
+    pga, sas, tc, td = get_indexed_parameter_table().sa_values[row].tolist()
 
     return pga, sas, tc, td
 
 
+def retrieve_sa_parameters_many(
+    location_ids: "npt.ArrayLike",
+    apoe_ns: "npt.ArrayLike",
+    site_classes: "npt.ArrayLike",
+) -> "npt.NDArray":
+    """retrieves the spectral acceleration parameters for many lines of the TS table
+
+    The arguments are broadcast against each other, e.g. one location with lists of
+    APoEs and site classes.
+
+    Args:
+        location_ids: labels for TS locations (e.g., 'Wellington' or '-47.3~167.8')
+        apoe_ns: shorthand for APoE (1/n)  (this is commonly known as a return period)
+        site_classes: TS site class labels (e.g., 'IV')
+
+    Returns:
+        parameters: pga, sas, tc, and td (last dimension) of each line
+    """
+
+    rows = _table_rows(location_ids, apoe_ns, site_classes)
+    return get_indexed_parameter_table().sa_values[rows]
+
+
 def retrieve_md_parameters(
     location_id: str, apoe_n: int, site_class: str
 ) -> Tuple[float, float | str]:
@@ -62,12 +142,8 @@ def retrieve_md_parameters(
         d: distance to nearest fault
     """
 
-    loc_idx = PARAMETER_TABLE["Location"] == location_id
-    apoe_idx = PARAMETER_TABLE["APoE (1/n)"] == apoe_n
-    sc_idx = PARAMETER_TABLE["Site Class"] == site_class
-
-    idx = loc_idx & apoe_idx & sc_idx
-    m, d = PARAMETER_TABLE[idx][["M", "D"]].iloc[0]
+    row = _table_rows([location_id], [apoe_n], [site_class])[0]
+    m, d = get_indexed_parameter_table().md_values[row].tolist()
 
     # d values are NAN for high APoE (low apoe_n)
     if apoe_n < APOE_N_THRESHOLD_FOR_D:
@@ -91,26 +167,21 @@ def parameters_by_location_id(location_id: str) -> "pdt.DataFrame":
     columns = pd.MultiIndex.from_product(
         [SITE_CLASSES_LIST, SA_PARAMETER_NAMES], names=["Site Class", "Parameter"]
     )
-    sa_df = pd.DataFrame(index=index, columns=columns)
-
-    for apoe_n in APOE_NS:
-        apoe = f"1/{apoe_n}"
-        for site_class in SITE_CLASSES_LIST:
-            sa_df.loc[(apoe), (site_class, slice(None))] = retrieve_sa_parameters(
-                location_id, apoe_n, site_class
-            )
+    apoe_ns, site_classes = np.meshgrid(APOE_NS, SITE_CLASSES_LIST, indexing="ij")
+    sa_values = retrieve_sa_parameters_many(location_id, apoe_ns, site_classes)
+    sa_df = pd.DataFrame(
+        sa_values.reshape(len(APOE_NS), -1), index=index, columns=columns, dtype=object
+    )
 
     # initialize df for dm parameters
     columns = pd.MultiIndex.from_tuples(
         [("", "M"), ("", "D")], names=["Site Class", "Parameter"]
     )
-    md_df = pd.DataFrame(index=index, columns=columns)
-    for apoe_n in APOE_NS:
-        apoe = f"1/{apoe_n}"
-        for site_class in [SITE_CLASSES_LIST[0]]:
-            m, d = retrieve_md_parameters(location_id, apoe_n, site_class)
-            md_df.loc[(apoe), ("", "M")] = m
-            md_df.loc[(apoe), ("", "D")] = d
+    rows = _table_rows(location_id, APOE_NS, SITE_CLASSES_LIST[0])
+    md_values = get_indexed_parameter_table().md_values[rows]
+    # d values are NAN for high APoE (low apoe_n)
+    md_values[np.asarray(APOE_NS) < APOE_N_THRESHOLD_FOR_D, 1] = np.nan
+    md_df = pd.DataFrame(md_values, index=index, columns=columns, dtype=object)
 
     # combine md and sa parameters
     df = pd.concat([md_df, sa_df], axis=1)
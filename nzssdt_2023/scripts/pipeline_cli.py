@@ -45,6 +45,7 @@ from .pipeline_steps import (
     create_parameter_tables,
     get_hazard_curves,
     get_site_list,
+    prune_hcurve_cache,
 )
 
 version_manager = VersionManager()
@@ -73,7 +74,25 @@ def init(version_id, verbose):
 @click.argument("nzshm-model", type=str)
 @click.option("--verbose", "-V", is_flag=True, default=False)
 @click.option("--site-limit", type=int, default=0)
-def build_nshm(nzshm_model, verbose, site_limit):
+@click.option(
+    "--batch-size",
+    type=int,
+    default=0,
+    help="Query this many sites at a time, checkpointing each batch so that a rerun resumes.",
+)
+@click.option(
+    "--workers",
+    type=int,
+    default=1,
+    help="Number of batches to query at the same time.",
+)
+@click.option(
+    "--no-curve-cache",
+    is_flag=True,
+    default=False,
+    help="Query all curves, without reusing or adding to the local hazard curve cache.",
+)
+def build_nshm(nzshm_model, verbose, site_limit, batch_size, workers, no_curve_cache):
     """Import the NSHM hazard curves from a given model version
 
     Usage:
@@ -90,7 +109,22 @@ def build_nshm(nzshm_model, verbose, site_limit):
         )
 
     site_list = get_site_list(site_limit)
-    get_hazard_curves(site_list=site_list, site_limit=site_limit, hazard_id=nzshm_model)
+    get_hazard_curves(
+        site_list=site_list,
+        site_limit=site_limit,
+        hazard_id=nzshm_model,
+        batch_size=batch_size,
+        workers=workers,
+        curve_cache=not no_curve_cache,
+    )
+
+
+@cli.command("prune-cache")
+@click.argument("nzshm-model", type=str)
+def prune_cache(nzshm_model):
+    """Remove the hazard curves of a given model version from the local curve cache"""
+    n_removed = prune_hcurve_cache(nzshm_model)
+    click.echo(f"removed {n_removed} hazard curves of {nzshm_model} from the cache")
 
 
 @cli.command("03-tables")
@@ -99,7 +133,13 @@ def build_nshm(nzshm_model, verbose, site_limit):
 @click.option("--verbose", "-V", is_flag=True, default=False)
 @click.option("--no-cache", is_flag=True, default=False)
 @click.option("--site-limit", type=int, default=0)
-def build_tables(version_id, nzshm_model, verbose, no_cache, site_limit):
+@click.option(
+    "--workers",
+    type=int,
+    default=1,
+    help="Number of processes used to build the SA table.",
+)
+def build_tables(version_id, nzshm_model, verbose, no_cache, site_limit, workers):
     """Build the resource/v{n}/json tables from a given model version."""
     if verbose:
         click.echo(f"build version: {version_id} for model {nzshm_model}")
@@ -110,6 +150,7 @@ def build_tables(version_id, nzshm_model, verbose, no_cache, site_limit):
         site_limit=site_limit,
         no_cache=no_cache,
         overwrite_json=True,
+        workers=workers,
     )
 
 
@@ -208,13 +249,19 @@ def publish(version_id, nzshm_model, description, verbose, update):
 
 @cli.command("07-deliverables")
 @click.argument("version_id")
+@click.option(
+    "--spectra-table",
+    is_flag=True,
+    default=False,
+    help="Also build the precomputed spectra lookup table.",
+)
 @click.option("--verbose", "-V", is_flag=True, default=False)
-def build_deliverable(version_id, verbose):
+def build_deliverable(version_id, spectra_table, verbose):
     """Build the deliverable artifacts."""
     if verbose:
         click.echo("deliverables for version: %s" % version_id)
 
-    create_deliverables(version_id, overwrite=True)
+    create_deliverables(version_id, overwrite=True, spectra_table=spectra_table)
 
 
 @cli.command("ls")
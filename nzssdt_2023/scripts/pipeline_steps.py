@@ -18,6 +18,7 @@ from nzssdt_2023.config import (
 from nzssdt_2023.data_creation import constants
 from nzssdt_2023.data_creation import dm_parameter_generation as dm_gen
 from nzssdt_2023.data_creation import sa_parameter_generation as sa_gen
+from nzssdt_2023.data_creation.curve_cache import HazardCurveCache
 from nzssdt_2023.data_creation.gis_data import create_geojson_files
 from nzssdt_2023.data_creation.NSHM_to_hdf5 import query_NSHM_to_hdf5
 from nzssdt_2023.data_creation.query_NSHM import create_sites_df
@@ -47,6 +48,16 @@ def hf_filepath(site_limit: int = 0, working_folder: Path = working_folder):
     )
 
 
+def hcurve_cache_filepath(working_folder: Path = working_folder):
+    """
+    Get the path of the local hazard curve cache.
+
+    Args:
+        working_folder: the folder holding the cache
+    """
+    return working_folder / "hcurve_cache.sqlite"
+
+
 # TODO: is this redundant, see NSHM_to_hdf5.query_NSHM_to_hdf5
 # we want index but also the complete df, so split this and then we can pass sites_df to get_hazard_curves etc
 def get_site_list(site_limit: int = 0):
@@ -63,7 +74,12 @@ def get_site_list(site_limit: int = 0):
 
 
 def get_hazard_curves(
-    site_list: List[str], site_limit: int = 0, hazard_id: str = "NSHM_v1.0.4"
+    site_list: List[str],
+    site_limit: int = 0,
+    hazard_id: str = "NSHM_v1.0.4",
+    batch_size: int = 0,
+    workers: int = 1,
+    curve_cache: bool = True,
 ):
     """Retrieve the NSHM hazard curves into an HDF5 file into the working folder.
 
@@ -71,12 +87,42 @@ def get_hazard_curves(
         site_list: the list of site names.
         site_limit: the maximum number of sites to retriece.
         hazard_id: the hazard_id.
+        batch_size: the number of sites per checkpointed batch (0 for a single query).
+        workers: the number of batches to query at the same time.
+        curve_cache: whether to reuse (and add to) the local hazard curve cache.
     """
     hf_path = hf_filepath(site_limit=site_limit)
     log.info(f"building hdf5 for {hazard_id} with {site_limit} sites")
-    query_NSHM_to_hdf5(
-        hf_path, hazard_id=hazard_id, site_list=site_list, site_limit=site_limit
-    )
+    cache = HazardCurveCache(hcurve_cache_filepath()) if curve_cache else None
+    try:
+        query_NSHM_to_hdf5(
+            hf_path,
+            hazard_id=hazard_id,
+            site_list=site_list,
+            site_limit=site_limit,
+            batch_size=batch_size,
+            workers=workers,
+            cache=cache,
+        )
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+def prune_hcurve_cache(hazard_id: str) -> int:
+    """Remove the curves of a hazard model from the local hazard curve cache.
+
+    Args:
+        hazard_id: the hazard_id.
+
+    Returns:
+        the number of curves removed.
+    """
+    cache = HazardCurveCache(hcurve_cache_filepath())
+    try:
+        return cache.prune(hazard_id)
+    finally:
+        cache.close()
 
 
 def get_resources_version_path(version: str):
@@ -115,6 +161,7 @@ def build_json_tables(
     version: str,
     site_limit: int = 0,
     overwrite_json: bool = True,
+    workers: int = 1,
 ):
     """
     Build the SA and D_and_M tables and write them to json files.
@@ -125,6 +172,7 @@ def build_json_tables(
         version: the version string
         site_limit: the number of sites to limit to
         overwrite_json: whether to overwrite existing json files
+        workers: the number of processes used to build the SA table
     """
     version_folder = get_resources_version_path(version)
 
@@ -139,7 +187,7 @@ def build_json_tables(
     if overwrite_json | (not named_path.exists()) | (not gridded_path.exists()):
 
         log.info("build the SA and D_and_M tables")
-        sat_df = sa_gen.create_sa_table(hf_path)
+        sat_df = sa_gen.create_sa_table(hf_path, workers=workers)
 
         dm_df = DistMagTable(
             dm_gen.create_D_and_M_df(site_list, rp_list=constants.DEFAULT_RPS)
@@ -179,6 +227,7 @@ def create_parameter_tables(
     site_limit: int = 0,
     no_cache: bool = False,
     overwrite_json: bool = True,
+    workers: int = 1,
 ):
     """
     Create and save the parameter tables for the given version and hazard_id.
@@ -191,6 +240,7 @@ def create_parameter_tables(
         site_limit: the number of sites to limit to
         no_cache: whether to ignore the cache
         overwrite_json: whether to overwrite existing json files
+        workers: the number of processes used to build the SA table
     """
 
     hf_path = hf_filepath(site_limit=site_limit)
@@ -205,16 +255,19 @@ def create_parameter_tables(
 
     # build the tables
     sites = sites_df.index.tolist()
-    build_json_tables(hf_path, sites, version, site_limit, overwrite_json)
+    build_json_tables(hf_path, sites, version, site_limit, overwrite_json, workers)
 
 
-def create_deliverables(version: str, overwrite: bool = False):
+def create_deliverables(
+    version: str, overwrite: bool = False, spectra_table: bool = False
+):
     """
     Create the deliverable zip file for Standards New Zealand.
 
     Args:
         version: the version string
         override: whether to override existing files
+        spectra_table: whether to also build the precomputed spectra lookup table
     """
 
     reports_folder = get_reports_version_path(version)
@@ -235,6 +288,7 @@ def create_deliverables(version: str, overwrite: bool = False):
         reports_folder,
         resources_folder,
         override=overwrite,
+        spectra_table=spectra_table,
     )
 
 
@@ -10,6 +10,9 @@ from typing import List
 import pandas as pd
 
 from nzssdt_2023.config import WORKING_FOLDER
+from nzssdt_2023.end_user_functions.columnar_table import save_columnar_table
+from nzssdt_2023.end_user_functions.constants import read_parameter_table
+from nzssdt_2023.end_user_functions.create_spectra import save_spectra_table
 
 
 def copy_files_to_deliverable(gns_files: List[Path], snz_files: List[Path]):
@@ -65,6 +68,44 @@ def copy_csv_reports_to_deliverable(
         )
 
 
+def save_columnar_deliverables(json_files: List[Path], npz_files: List[Path]):
+    """
+    save the json parameter tables in the columnar format read by the end user functions
+
+    Args:
+        json_files: list of json table paths in deliverables folder
+        npz_files: list of npz table paths in deliverables folder
+
+    """
+
+    for json_file, npz_file in zip(json_files, npz_files):
+        table = pd.read_json(json_file, orient="table", precise_float=True)
+        save_columnar_table(table, npz_file)
+
+
+def save_spectra_deliverable(
+    json_files: List[Path], npz_files: List[Path], spectra_file: Path
+):
+    """
+    save the precomputed spectra of every line of the parameter tables
+
+    Args:
+        json_files: list of json table paths in deliverables folder
+        npz_files: list of npz table paths in deliverables folder
+        spectra_file: path to the npz spectra table in deliverables folder
+
+    """
+
+    table = pd.concat(
+        [
+            read_parameter_table(json_file, npz_file)
+            for json_file, npz_file in zip(json_files, npz_files)
+        ],
+        axis=0,
+    )
+    save_spectra_table(table, spectra_file)
+
+
 def archive_zip_folder(source_path: Path, zip_path: Path):
     """
     zip the deliverables folder
@@ -96,6 +137,7 @@ def create_deliverables_zipfile(
     reports_folder: Path,
     resources_folder: Path,
     override: bool = False,
+    spectra_table: bool = False,
 ) -> Path:
     """
     identify the relevant reports and resources and includes them in a zipfile
@@ -107,6 +149,7 @@ def create_deliverables_zipfile(
         reports_folder: path to the reports folder for the version
         resources_folder: path to the resources folder for the version
         override: if True, rewrite all files
+        spectra_table: if True, also save the precomputed spectra of the parameter tables
 
     Returns:
          zip_path: path to the zip file deliverable
@@ -167,6 +210,10 @@ def create_deliverables_zipfile(
     )
     snz_geojsons = [snz_polygons, snz_grid_points, snz_faults]
     snz_jsons = [snz_named_json, snz_grid_json]
+    snz_npzs = [snz_json.with_suffix(".npz") for snz_json in snz_jsons]
+    snz_spectra = Path(
+        deliverables_folder, f"{snz_name_prefix}_Spectra_{publication_year}.npz"
+    )
 
     if (
         override
@@ -179,6 +226,7 @@ def create_deliverables_zipfile(
         | (not snz_polygons.exists())
         | (not snz_grid_points.exists())
         | (not snz_faults.exists())
+        | (not all(snz_npz.exists() for snz_npz in snz_npzs))
     ):
 
         # create deliverables version folder
@@ -192,7 +240,11 @@ def create_deliverables_zipfile(
         copy_csv_reports_to_deliverable(gns_csv_files, snz_csv_files)
         zip_path = archive_zip_folder(deliverables_folder, zip_path)
 
-        # add jsons outside of the zipped folder
+        # add jsons and their columnar versions outside of the zipped folder
         copy_files_to_deliverable(gns_jsons, snz_jsons)
+        save_columnar_deliverables(snz_jsons, snz_npzs)
+
+    if spectra_table & (override | (not snz_spectra.exists())):
+        save_spectra_deliverable(snz_jsons, snz_npzs, snz_spectra)
 
     return zip_path
@@ -1,10 +1,19 @@
+import itertools
+import random
+import zlib
 from pathlib import Path
+from types import SimpleNamespace
 
 import geopandas as gpd
+import h5py
 import pandas as pd
 import pytest
 
 import nzssdt_2023.data_creation.sa_parameter_generation as sa_gen
+from nzssdt_2023.data_creation import query_NSHM
+from nzssdt_2023.data_creation.constants import IMTL_LIST
+from nzssdt_2023.data_creation.extract_data import HazardDataset
+from nzssdt_2023.data_creation.NSHM_to_hdf5 import convert_imtls_to_disp, save_hdf
 from nzssdt_2023.data_creation.util import set_coded_location_resolution
 
 FIXTURES = Path(__file__).parent.parent / "fixtures"
@@ -16,6 +25,66 @@ SITECLASS_COLUMN_MAPPING = {
 }  # modify CSV file headings to match ours
 
 
+class FakeHazardStore:
+    """a local stand-in for `toshi_hazard_store.query.get_hazard_curves`
+
+    The curves are deterministic, returned in a shuffled order and queries including
+    any of the `failing_locations` raise a ConnectionError part way through.
+    """
+
+    levels = IMTL_LIST
+
+    def __init__(self):
+        self.queried_locations = set()
+        self.failing_locations = set()
+        self.queries = []
+
+    @classmethod
+    def curve_values(cls, latlon, vs30, imt, agg):
+        seed = zlib.crc32(f"{latlon}{vs30}{imt}{agg}".encode())
+        return [(seed % 997 + 1) / 1000 * 0.8**i for i in range(len(cls.levels))]
+
+    def get_hazard_curves(self, locs, vs30s, hazard_ids, imts, aggs):
+        locs = list(locs)
+        self.queried_locations.update(locs)
+        self.queries.append((locs, list(vs30s), list(imts), list(aggs)))
+
+        curves = []
+        for latlon, vs30, imt, agg in itertools.product(
+            dict.fromkeys(locs), vs30s, imts, aggs
+        ):
+            lat, lon = (float(value) for value in latlon.split("~"))
+            values = self.curve_values(latlon, vs30, imt, agg)
+            curves.append(
+                SimpleNamespace(
+                    lat=lat,
+                    lon=lon,
+                    vs30=vs30,
+                    imt=imt,
+                    agg=agg,
+                    values=[
+                        SimpleNamespace(lvl=lvl, val=val)
+                        for lvl, val in zip(self.levels, values)
+                    ],
+                )
+            )
+        random.Random(len(curves)).shuffle(curves)
+
+        for i, curve in enumerate(curves):
+            if i > len(curves) // 2 and self.failing_locations.intersection(locs):
+                raise ConnectionError("hazard store unavailable")
+            yield curve
+
+
+@pytest.fixture
+def fake_hazard_store(mocker):
+    store = FakeHazardStore()
+    mocker.patch.object(
+        query_NSHM, "get_hazard_curves", side_effect=store.get_hazard_curves
+    )
+    yield store
+
+
 @pytest.fixture(scope="module")
 def sas_tc_td_parameters():
     path = FIXTURES / "sas-tc-td_parameters/TS_parameters_all.csv"
@@ -28,6 +97,39 @@ def mini_hcurves_hdf5_path():
     yield FIXTURES / "mini_hcurves.hdf5"
 
 
+@pytest.fixture(scope="module")
+def mini_hcurves_data(mini_hcurves_hdf5_path):
+    """the data dictionary of the mini hcurves fixture, as passed to `save_hdf`"""
+    with HazardDataset(mini_hcurves_hdf5_path) as dataset, h5py.File(
+        mini_hcurves_hdf5_path, "r"
+    ) as hf:
+        yield {
+            "metadata": {
+                "vs30s": dataset.vs30s,
+                "quantiles": dataset.quantiles,
+                "acc_imtls": dataset.imtls,
+                "disp_imtls": convert_imtls_to_disp(dataset.imtls),
+                "sites": dataset.sites,
+            },
+            "hcurves": {"hcurves_stats": hf["hcurves"]["hcurves_stats"][:]},
+            "hazard_design": {
+                "hazard_rps": dataset.hazard_rps,
+                "acc": {"stats_im_hazard": dataset.acc_spectra},
+                "disp": {
+                    "stats_im_hazard": hf["hazard_design"]["disp"]["stats_im_hazard"][:]
+                },
+            },
+        }
+
+
+@pytest.fixture(scope="module")
+def current_hcurves_hdf5_path(tmp_path_factory, mini_hcurves_data):
+    """the mini hcurves fixture re-written with the current hdf5 layout"""
+    path = tmp_path_factory.mktemp("hdf5") / "mini_hcurves.hdf5"
+    save_hdf(path, mini_hcurves_data)
+    yield path
+
+
 @pytest.fixture(scope="module")
 def pga_reduced_rp_2500():
     path = FIXTURES / "reduced_PGA/PGA_Adjusted_RP_2500_years.csv"
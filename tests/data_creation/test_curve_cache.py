@@ -0,0 +1,102 @@
+"""
+test the local hazard curve cache in `nzssdt_2023.data_creation.curve_cache`
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from nzssdt_2023.data_creation import query_NSHM
+from nzssdt_2023.data_creation.curve_cache import HazardCurveCache
+
+VS30_LIST = [275, 400]
+IMT_LIST = ["PGA", "SA(1.0)"]
+AGG_LIST = ["mean", "0.9"]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = HazardCurveCache(tmp_path / "hcurve_cache.sqlite")
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def sites():
+    return pd.DataFrame(
+        {"latlon": ["-36.852~174.763", "-41.300~174.780", "-43.531~172.637"]},
+        index=["Auckland", "Wellington", "Christchurch"],
+    )
+
+
+def test_put_get_prune(tmp_path, cache):
+    curve = ([0.1, 0.2, 0.3], [0.5, 0.25, 1e-9])
+    key = ("-41.300~174.780", 400, "PGA", "mean")
+    cache.put_curves("NSHM_v1", {key: curve})
+    cache.put_curves("NSHM_v2", {key: curve, key[:3] + ("0.9",): curve})
+
+    missing = ("-41.300~174.780", 750, "PGA", "mean")
+    assert cache.get_curves("NSHM_v1", [key, missing]) == {key: curve}
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 3}
+
+    # the cache persists
+    cache.close()
+    cache = HazardCurveCache(tmp_path / "hcurve_cache.sqlite")
+    assert cache.get_curves("NSHM_v2", [key]) == {key: curve}
+
+    assert cache.prune("NSHM_v2") == 2
+    assert cache.get_curves("NSHM_v2", [key]) == {}
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1}
+    cache.close()
+
+
+def test_retrieve_hazard_curves_cached(cache, fake_hazard_store, sites):
+    query = (VS30_LIST, IMT_LIST, AGG_LIST, "NSHM_v99")
+    expected, expected_imtls = query_NSHM.retrieve_hazard_curves(sites, *query)
+
+    hcurves, imtl_list = query_NSHM.retrieve_hazard_curves(sites, *query, cache)
+    np.testing.assert_array_equal(hcurves, expected)
+    assert cache.stats() == {"hits": 0, "misses": 24, "entries": 24}
+
+    # all curves are cached
+    fake_hazard_store.queries = []
+    hcurves, imtl_list = query_NSHM.retrieve_hazard_curves(sites, *query, cache)
+    assert fake_hazard_store.queries == []
+    np.testing.assert_array_equal(hcurves, expected)
+    assert imtl_list == expected_imtls
+    assert cache.stats() == {"hits": 24, "misses": 24, "entries": 24}
+
+
+def test_retrieve_hazard_curves_queries_missing(cache, fake_hazard_store, sites):
+    query_NSHM.retrieve_hazard_curves(
+        sites[:2], VS30_LIST, IMT_LIST, AGG_LIST, "NSHM_v99", cache
+    )
+
+    # a new site
+    fake_hazard_store.queries = []
+    hcurves, _ = query_NSHM.retrieve_hazard_curves(
+        sites, VS30_LIST, IMT_LIST, AGG_LIST, "NSHM_v99", cache
+    )
+    assert fake_hazard_store.queries == [
+        (["-43.531~172.637"], VS30_LIST, IMT_LIST, AGG_LIST)
+    ]
+    expected, _ = query_NSHM.retrieve_hazard_curves(
+        sites, VS30_LIST, IMT_LIST, AGG_LIST, "NSHM_v99"
+    )
+    np.testing.assert_array_equal(hcurves, expected)
+
+    # a new vs30
+    fake_hazard_store.queries = []
+    query_NSHM.retrieve_hazard_curves(
+        sites, VS30_LIST + [750], IMT_LIST, AGG_LIST, "NSHM_v99", cache
+    )
+    assert fake_hazard_store.queries == [
+        (list(sites["latlon"]), [750], IMT_LIST, AGG_LIST)
+    ]
+
+    # another model
+    fake_hazard_store.queries = []
+    query_NSHM.retrieve_hazard_curves(
+        sites, VS30_LIST, IMT_LIST, AGG_LIST, "NSHM_v100", cache
+    )
+    assert len(fake_hazard_store.queries) == 2  # the imtls and the curves
@@ -1,11 +1,19 @@
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
 import pandas as pd
 import pandas.testing
 import pytest
 from toshi_hazard_store.model import AggregationEnum
 
 import nzssdt_2023.data_creation.dm_parameter_generation as dm_parameter_generation
+import nzssdt_2023.data_creation.mean_magnitudes as mean_magnitudes
+from nzssdt_2023.config import DISAGG_HAZARD_ID
+from nzssdt_2023.data_creation.mean_magnitudes import (
+    MeanMagnitudeStore,
+    frequency_to_poe,
+    site_name_to_coded_location,
+)
 
 SITE_NAMES = ["Paihia", "Opua", "-46.200~166.600"]
 FREQUENCIES = [
@@ -26,18 +34,22 @@ def test_extract_m_values(mean_mags_fixture):
     pandas.testing.assert_index_equal(df.index, pd.Index(SITE_NAMES, name="site_name"))
 
 
+def read_store(site_names, frequencies, agg=AGG, legacy=False):
+    store = MeanMagnitudeStore(dm_parameter_generation.mean_mag_store_filepath())
+    locations = [site_name_to_coded_location(name).code for name in site_names]
+    poes = [frequency_to_poe(freq) for freq in frequencies]
+    df = store.get_mags(DISAGG_HAZARD_ID, agg, locations, poes, legacy)
+    df.index, df.columns = pd.Index(site_names, name="site_name"), frequencies
+    return df
+
+
 # create a cache with a small number of sites. then run again with more sites. Do I get the correct DataFrame?
 def test_extract_m_values_cache(mean_mags_fixture, workingfolder_fixture):
-    cache_filepath = (
-        Path(dm_parameter_generation.WORKING_FOLDER) / f"mag_agg-{AGG.name}.csv"
-    )
-
     _ = dm_parameter_generation.extract_m_values(SITE_NAMES, FREQUENCIES, AGG)
     site_names = SITE_NAMES + ["-45.500~166.700", "Maraetai"]
-    df_cache = pd.read_csv(cache_filepath, index_col=["site_name"])
-    pandas.testing.assert_index_equal(
-        df_cache.index, pd.Index(SITE_NAMES, name="site_name"), check_order=False
-    )
+    df_cache = read_store(site_names, FREQUENCIES)
+    assert not df_cache.loc[SITE_NAMES].isnull().values.any()
+    assert df_cache.loc[site_names[3:]].isnull().values.all()
 
     # create a chache. re-run w/ same locs. do I get correct df?
     df1 = dm_parameter_generation.extract_m_values(site_names, FREQUENCIES, AGG)
@@ -45,7 +57,7 @@ def test_extract_m_values_cache(mean_mags_fixture, workingfolder_fixture):
         df1.index, pd.Index(site_names, name="site_name"), check_order=False
     )
 
-    df_cache = pd.read_csv(cache_filepath, index_col=["site_name"])
+    df_cache = read_store(site_names, FREQUENCIES)
     pandas.testing.assert_frame_equal(df_cache, df1, check_like=True)
 
 
@@ -57,12 +69,8 @@ def test_extract_m_values_poes1(mean_mags_fixture, workingfolder_fixture):
     df1 = dm_parameter_generation.extract_m_values(SITE_NAMES, frequencies, AGG)
     assert (df1.columns == frequencies).all()
 
-    cache_filepath = (
-        Path(dm_parameter_generation.WORKING_FOLDER) / f"mag_agg-{AGG.name}.csv"
-    )
-    df_cache = pd.read_csv(cache_filepath, index_col=["site_name"])
-    print(df1)
-    print(df_cache)
+    df_cache = read_store(SITE_NAMES, frequencies)
+    pandas.testing.assert_frame_equal(df_cache, df1)
 
 
 # new locations and new poes
@@ -149,3 +157,112 @@ def test_M_values_against_v1(dandm_v1):
             #     print(f'{site}, {apoe}: {dandm_v1.loc[site, apoe]}, {m_values.loc[site, apoe]}')
 
     assert 0
+
+
+# the missing values are fetched in bulk, one query per set of missing frequencies
+def test_extract_m_values_bulk_fetch(mean_mags_fixture, workingfolder_fixture, mocker):
+    _ = dm_parameter_generation.extract_m_values(SITE_NAMES, FREQUENCIES, AGG)
+
+    spy = mocker.spy(mean_magnitudes, "get_mean_mags")
+    site_names = SITE_NAMES + ["-45.500~166.700", "Maraetai"]
+    frequencies = FREQUENCIES + ["APoE: 1/50", "APoE: 1/250"]
+    df = dm_parameter_generation.extract_m_values(site_names, frequencies, AGG)
+
+    assert spy.call_count == 2
+    queried = sorted(
+        (len(call.args[1]), len(call.args[4])) for call in spy.call_args_list
+    )
+    assert queried == [(2, 7), (3, 2)]
+    assert not df.isnull().values.any()
+
+    # everything is cached now
+    spy.reset_mock()
+    dm_parameter_generation.extract_m_values(site_names, frequencies, AGG)
+    assert spy.call_count == 0
+
+
+# the store is keyed by hazard aggregate and legacy rounding
+def test_extract_m_values_store_keys(mean_mags_fixture, workingfolder_fixture, mocker):
+    spy = mocker.spy(mean_magnitudes, "get_mean_mags")
+    dm_parameter_generation.extract_m_values(SITE_NAMES, FREQUENCIES, AGG)
+    dm_parameter_generation.extract_m_values(
+        SITE_NAMES, FREQUENCIES, AggregationEnum._90
+    )
+    dm_parameter_generation.extract_m_values(SITE_NAMES, FREQUENCIES, AGG, legacy=True)
+    assert spy.call_count == 3
+
+    dm_parameter_generation.extract_m_values(SITE_NAMES, FREQUENCIES, AGG)
+    assert spy.call_count == 3
+
+
+def test_mean_magnitude_store_upsert(tmp_path):
+    store = MeanMagnitudeStore(tmp_path / "mean_mags.sqlite")
+    poes = [frequency_to_poe(freq) for freq in FREQUENCIES[:2]]
+    locations = pd.Index(["-41.300~174.780", "-46.200~166.600"], name="location")
+
+    mags = pd.DataFrame([[5.1, np.nan], [6.1, 6.2]], index=locations, columns=poes)
+    store.put_mags(DISAGG_HAZARD_ID, AGG, mags)
+    pandas.testing.assert_frame_equal(
+        store.get_mags(DISAGG_HAZARD_ID, AGG, locations, poes), mags
+    )
+
+    store.put_mags(
+        DISAGG_HAZARD_ID,
+        AGG,
+        pd.DataFrame([[7.0]], index=locations[:1], columns=poes[1:]),
+    )
+    expected = mags.copy()
+    expected.iloc[0, 1] = 7.0
+    pandas.testing.assert_frame_equal(
+        store.get_mags(DISAGG_HAZARD_ID, AGG, locations, poes), expected
+    )
+    assert (
+        store.get_mags(DISAGG_HAZARD_ID, AGG, locations, poes, legacy=True)
+        .isnull()
+        .values.all()
+    )
+
+
+def test_mean_magnitude_store_concurrent_writes(tmp_path):
+    db_path = tmp_path / "mean_mags.sqlite"
+    poes = [frequency_to_poe(freq) for freq in FREQUENCIES]
+    locations = [f"-4{i // 10}.{i % 10}00~170.000" for i in range(40)]
+
+    def write(i_location):
+        mags = pd.DataFrame(
+            [[float(i_location)] * len(poes)],
+            index=[locations[i_location]],
+            columns=poes,
+        )
+        MeanMagnitudeStore(db_path).put_mags(DISAGG_HAZARD_ID, AGG, mags)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(write, range(len(locations))))
+
+    mags = MeanMagnitudeStore(db_path).get_mags(DISAGG_HAZARD_ID, AGG, locations, poes)
+    np.testing.assert_array_equal(
+        mags.to_numpy(), np.repeat(np.arange(40.0)[:, None], len(poes), axis=1)
+    )
+
+
+def test_mean_magnitude_store_reads_requested_keys(tmp_path, mocker):
+    store = MeanMagnitudeStore(tmp_path / "mean_mags.sqlite")
+    poes = [frequency_to_poe(freq) for freq in FREQUENCIES]
+    locations = [f"-4{i // 1000}.{i % 1000:03d}~170.000" for i in range(2000)]
+    mags = pd.DataFrame(
+        np.arange(2000.0)[:, None] + np.arange(len(poes)) / 10,
+        index=locations,
+        columns=poes,
+    )
+    store.put_mags(DISAGG_HAZARD_ID, AGG, mags)
+
+    spy = mocker.spy(mean_magnitudes.pd, "read_sql_query")
+    requested = [locations[1500], "-10.000~170.000", locations[3], locations[1500]]
+    found = store.get_mags(DISAGG_HAZARD_ID, AGG, requested, poes[1:3])
+
+    assert len(spy.spy_return) == 4
+    np.testing.assert_array_equal(
+        found.to_numpy(),
+        [[1500.1, 1500.2], [np.nan, np.nan], [3.1, 3.2], [1500.1, 1500.2]],
+    )
+    assert list(found.columns) == poes[1:3]
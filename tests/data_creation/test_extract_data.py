@@ -0,0 +1,189 @@
+"""
+test the `HazardDataset` in `nzssdt_2023.data_creation.extract_data`
+"""
+
+import h5py
+import numpy as np
+import pandas as pd
+import pytest
+
+import nzssdt_2023.data_creation.sa_parameter_generation as sa_gen
+from nzssdt_2023.data_creation import extract_data
+from nzssdt_2023.data_creation.constants import HDF5_FORMAT_VERSION
+from nzssdt_2023.data_creation.extract_data import HazardDataset
+from nzssdt_2023.data_creation.NSHM_to_hdf5 import save_hdf
+
+
+def test_dataset_matches_extract_functions(mini_hcurves_hdf5_path):
+    with HazardDataset(mini_hcurves_hdf5_path) as dataset:
+        acc_spectra, imtls = dataset.spectra()
+
+        with h5py.File(mini_hcurves_hdf5_path, "r") as hf:
+            expected = hf["hazard_design"]["acc"]["stats_im_hazard"][:]
+        np.testing.assert_array_equal(acc_spectra, expected)
+
+        assert imtls == extract_data.extract_spectra(mini_hcurves_hdf5_path)[1]
+        assert dataset.sites.equals(extract_data.extract_sites(mini_hcurves_hdf5_path))
+        assert dataset.vs30s == extract_data.extract_vs30s(mini_hcurves_hdf5_path)
+        assert dataset.quantiles == extract_data.extract_quantiles(
+            mini_hcurves_hdf5_path
+        )
+        assert (dataset.APoEs, dataset.hazard_rps) == extract_data.extract_APoEs(
+            mini_hcurves_hdf5_path
+        )
+
+
+def test_dataset_opens_file_once(mocker, mini_hcurves_hdf5_path):
+    spy = mocker.spy(extract_data.h5py, "File")
+
+    with HazardDataset(mini_hcurves_hdf5_path) as dataset:
+        first = dataset.spectra()[0]
+        for _ in range(3):
+            extract_data.extract_sites(dataset)
+            extract_data.extract_APoEs(dataset)
+            extract_data.extract_quantiles(dataset)
+            assert extract_data.extract_spectra(dataset)[0] is first
+
+    assert spy.call_count == 1
+
+
+def test_dataset_cache_survives_close(mini_hcurves_hdf5_path):
+    dataset = HazardDataset(mini_hcurves_hdf5_path)
+    acc_spectra, _ = dataset.spectra()
+    sites = dataset.sites
+    dataset.close()
+
+    assert dataset.spectra()[0] is acc_spectra
+    assert dataset.sites is sites
+
+
+def test_dataset_spectra_read_only(mini_hcurves_hdf5_path):
+    with HazardDataset(mini_hcurves_hdf5_path) as dataset:
+        acc_spectra, _ = dataset.spectra()
+        with pytest.raises(ValueError):
+            acc_spectra[0, 0, 0, 0, 0] = 1.0
+
+
+@pytest.mark.parametrize("cached", [False, True])
+def test_dataset_spectra_site_slice(mini_hcurves_hdf5_path, cached):
+    site_slice = slice(1, 4)
+    expected, _ = extract_data.extract_spectra(mini_hcurves_hdf5_path)
+
+    with HazardDataset(mini_hcurves_hdf5_path) as dataset:
+        if cached:
+            dataset.spectra()
+        acc_spectra, _ = dataset.spectra(site_slice)
+
+    np.testing.assert_array_equal(acc_spectra, expected[:, site_slice])
+
+
+def test_create_sa_table_from_dataset(mini_hcurves_hdf5_path):
+    expected = sa_gen.create_sa_table(mini_hcurves_hdf5_path)
+
+    with HazardDataset(mini_hcurves_hdf5_path) as dataset:
+        df = sa_gen.create_sa_table(dataset)
+
+    assert df.to_json() == expected.to_json()
+
+
+def test_create_sa_table_opens_file_once(mocker, mini_hcurves_hdf5_path):
+    spy = mocker.spy(extract_data.h5py, "File")
+    sa_gen.create_sa_table(mini_hcurves_hdf5_path)
+    assert spy.call_count == 1
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_create_sa_table_reads_spectra_once(
+    monkeypatch, mini_hcurves_hdf5_path, workers
+):
+    spectra_reads = []
+    getitem = h5py.Dataset.__getitem__
+
+    def counting_getitem(dset, *args, **kwargs):
+        if dset.name == "/hazard_design/acc/stats_im_hazard":
+            spectra_reads.append(args)
+        return getitem(dset, *args, **kwargs)
+
+    monkeypatch.setattr(h5py.Dataset, "__getitem__", counting_getitem)
+    sa_gen.create_sa_table(mini_hcurves_hdf5_path, workers=workers)
+
+    # the sharded path reads each shard in a worker process, then all sites once here
+    assert len(spectra_reads) == 1
+
+
+def test_current_layout_metadata(current_hcurves_hdf5_path):
+    with h5py.File(current_hcurves_hdf5_path, "r") as hf:
+        assert hf.attrs["format_version"] == HDF5_FORMAT_VERSION
+        assert not {"sites", "acc_imtls", "disp_imtls"} & set(hf["metadata"].attrs)
+        assert hf["metadata"]["sites"].dtype.names == ("site", "latlon", "lat", "lon")
+        assert hf["metadata"]["acc_imtls"]["SA(1.0)"].dtype == np.float64
+
+
+def test_current_layout_matches_legacy(
+    mini_hcurves_hdf5_path, current_hcurves_hdf5_path
+):
+    with HazardDataset(mini_hcurves_hdf5_path) as legacy, HazardDataset(
+        current_hcurves_hdf5_path
+    ) as current:
+        assert legacy.format_version == 1
+        assert current.format_version == HDF5_FORMAT_VERSION
+
+        assert current.imtls == legacy.imtls
+        assert list(current.imtls) == list(legacy.imtls)
+        pd.testing.assert_frame_equal(current.sites, legacy.sites)
+        assert current.vs30s == legacy.vs30s
+        assert current.quantiles == legacy.quantiles
+        assert current.hazard_rps == legacy.hazard_rps
+        np.testing.assert_array_equal(current.acc_spectra, legacy.acc_spectra)
+
+
+def test_create_sa_table_current_layout(
+    mini_hcurves_hdf5_path, current_hcurves_hdf5_path
+):
+    expected = sa_gen.create_sa_table(mini_hcurves_hdf5_path)
+    df = sa_gen.create_sa_table(current_hcurves_hdf5_path)
+
+    assert df.to_json() == expected.to_json()
+
+
+def test_unknown_format_version(tmp_path, current_hcurves_hdf5_path):
+    path = tmp_path / "future.hdf5"
+    path.write_bytes(current_hcurves_hdf5_path.read_bytes())
+    with h5py.File(path, "r+") as hf:
+        hf.attrs["format_version"] = HDF5_FORMAT_VERSION + 1
+
+    with HazardDataset(path) as dataset:
+        with pytest.raises(ValueError, match="format version"):
+            dataset.sites
+
+
+@pytest.mark.parametrize(
+    "site_chunk_size, compression", [(None, None), (2, None), (2, "lzf"), (16, "gzip")]
+)
+def test_chunked_compressed_layout(
+    tmp_path, mini_hcurves_data, mini_hcurves_hdf5_path, site_chunk_size, compression
+):
+    path = tmp_path / "mini_hcurves.hdf5"
+    save_hdf(path, mini_hcurves_data, site_chunk_size, compression)
+
+    with h5py.File(path, "r") as hf:
+        for name in ["hcurves/hcurves_stats", "hazard_design/acc/stats_im_hazard"]:
+            dset = hf[name]
+            assert dset.dtype == np.float32
+            assert dset.compression == compression
+            assert dset.shuffle == (compression is not None)
+            if site_chunk_size:
+                assert dset.chunks[1] == min(site_chunk_size, dset.shape[1])
+                assert dset.chunks[2:] == dset.shape[2:]
+            elif compression is None:
+                assert dset.chunks is None
+
+        with h5py.File(mini_hcurves_hdf5_path, "r") as legacy:
+            np.testing.assert_array_equal(
+                hf["hcurves/hcurves_stats"][:], legacy["hcurves/hcurves_stats"][:]
+            )
+
+    expected, _ = extract_data.extract_spectra(mini_hcurves_hdf5_path)
+    with HazardDataset(path) as dataset:
+        np.testing.assert_array_equal(dataset.spectra(slice(1, 3))[0], expected[:, 1:3])
+        np.testing.assert_array_equal(dataset.spectra()[0], expected)
@@ -12,6 +12,7 @@ from nzssdt_2023.data_creation.constants import (
 )
 from nzssdt_2023.data_creation.gis_data import (
     build_d_value_dataframe,
+    calc_distance_to_faults,
     cleanup_polygon_gpd,
     create_grid_gpd,
     filter_cfm_by_sliprate,
@@ -77,3 +78,28 @@ def test_D_values_against_v1(dandm_v1):
 
     # confirm that the reordered D values are the same
     assert D_values.loc[dandm_v1.index, "D"].equals(dandm_v1["D"])
+
+
+# the spatial index gives the same D values as the distance to every fault
+def test_calc_distance_to_faults_vs_all_faults(grid_points_expected, faults_v1):
+
+    # the fixture is shared by the module, `test_grid_points` indexes it in place
+    grid = grid_points_expected.copy()
+    if grid.index.name != "Name":
+        grid = grid.set_index("Name")
+    polygons = grid.iloc[::7].to_crs(epsg=2193)
+    polygons["geometry"] = polygons.buffer(3000).envelope
+    polygons = polygons.to_crs(epsg=4326)
+
+    faults = faults_v1.to_crs(epsg=2193)
+    for gdf in [grid, polygons]:
+        distance = gdf.to_crs(epsg=2193).geometry.apply(
+            lambda x: faults.distance(x).min()
+        )
+        expected = round(distance / 1000.0).astype("int")
+        expected = expected.where(expected < 20)
+
+        D_values = calc_distance_to_faults(gdf.copy(), faults_v1.copy())
+
+        assert D_values["D"].notnull().any() and D_values["D"].isnull().any()
+        assert D_values["D"].equals(expected.set_axis(D_values.index).rename("D"))
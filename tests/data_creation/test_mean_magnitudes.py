@@ -1,4 +1,6 @@
 import json
+import subprocess
+import sys
 from collections import namedtuple
 from pathlib import Path
 
@@ -11,8 +13,12 @@ from nzshm_common.location import CodedLocation
 from nzshm_common.location.location import LOCATION_LISTS, location_by_id
 from toshi_hazard_store.model import AggregationEnum, ProbabilityEnum
 
+import nzssdt_2023.data_creation.mean_magnitudes as mean_magnitudes
 from nzssdt_2023.data_creation.mean_magnitudes import (
+    calculate_mean_magnitude,
+    calculate_mean_magnitudes,
     frequency_to_poe,
+    get_loc_id_and_name,
     get_mean_mag_df,
     poe_to_rp,
     read_mean_mag_df,
@@ -192,3 +198,64 @@ def test_mean_mag_df(get_disagg_fixture, tmp_path):
     df.to_csv(csv_filepath)
     df_from_csv = read_mean_mag_df(csv_filepath)
     pandas.testing.assert_frame_equal(df, df_from_csv)
+
+
+def test_mean_mag_df_unrequested_location(get_disagg_fixture):
+
+    missing_name = get_loc_id_and_name(LOCATIONS[-1].code)[1]
+    with pytest.raises(ValueError, match=f"include {missing_name},"):
+        get_mean_mag_df(HAZARD_ID, LOCATIONS[:-1], POES, HAZARD_AGG)
+
+
+def test_calculate_mean_magnitudes():
+    disaggs = list(mock_get_disagg(None, None, None, None, None, None, None))
+    bins = disaggs[0].bins
+    stacked = np.stack([disagg.disaggs for disagg in disaggs])
+
+    expected = [calculate_mean_magnitude(disagg.disaggs, bins) for disagg in disaggs]
+    np.testing.assert_array_equal(calculate_mean_magnitudes(stacked, bins), expected)
+
+    with pytest.raises(Exception):
+        calculate_mean_magnitudes(stacked[:, :-1], bins)
+    with pytest.raises(Exception):
+        calculate_mean_magnitudes(stacked[0], bins)
+
+
+@pytest.mark.parametrize(
+    "location_code, expected",
+    [
+        ("-41.300~174.780", ("WLG", "Wellington")),
+        ("-45.500~166.600", ("-45.500~166.600", "-45.500~166.600")),
+    ],
+)
+def test_get_loc_id_and_name(location_code, expected):
+    assert get_loc_id_and_name(location_code) == expected
+
+
+def test_location_id_index_is_lazy():
+    # the index is not built on import
+    script = (
+        "from nzssdt_2023.data_creation import mean_magnitudes;"
+        "assert mean_magnitudes._location_id_index.cache_info().currsize == 0"
+    )
+    subprocess.run([sys.executable, "-c", script], check=True)
+
+    mean_magnitudes._location_id_index.cache_clear()
+    get_loc_id_and_name("-41.300~174.780")
+    get_loc_id_and_name("-36.870~174.770")
+    cache_info = mean_magnitudes._location_id_index.cache_info()
+    assert (cache_info.misses, cache_info.hits) == (1, 1)
+
+
+def test_location_id_index_first_id_wins(monkeypatch):
+    monkeypatch.setattr(
+        mean_magnitudes, "LOCATION_LISTS", {"ALL": {"locations": ["WLG", "AKL"]}}
+    )
+    monkeypatch.setattr(mean_magnitudes, "lat_lon_from_id", lambda _: (-41.3, 174.78))
+    mean_magnitudes._location_id_index.cache_clear()
+    try:
+        assert mean_magnitudes._location_id_index() == {
+            "-41.300~174.780": ("WLG", "Wellington")
+        }
+    finally:
+        mean_magnitudes._location_id_index.cache_clear()
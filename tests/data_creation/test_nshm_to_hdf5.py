@@ -0,0 +1,180 @@
+"""
+test the hazard curve retrieval and uniform hazard spectra calculations in
+`nzssdt_2023.data_creation.NSHM_to_hdf5`
+"""
+
+import h5py
+import numpy as np
+import pandas as pd
+import pytest
+
+import nzssdt_2023.data_creation.NSHM_to_hdf5 as nshm_to_hdf5
+import nzssdt_2023.data_creation.query_NSHM as q_haz
+from nzssdt_2023.data_creation.constants import DEFAULT_RPS
+from nzssdt_2023.data_creation.curve_cache import HazardCurveCache
+
+
+def calculate_hazard_design_intensities_loop(data, hazard_rps, intensity_type):
+    """the original (one curve at a time) implementation"""
+    hazard_rps = np.array(hazard_rps)
+    imtls = data["metadata"][f"{intensity_type}_imtls"]
+    hcurves_stats = np.array(data["hcurves"]["hcurves_stats"])
+    [n_vs30, n_sites, n_imts, _, n_stats] = hcurves_stats.shape
+
+    stats_im_hazard = np.zeros([n_vs30, n_sites, n_imts, len(hazard_rps), n_stats])
+    for i_vs30 in range(n_vs30):
+        for i_site in range(n_sites):
+            for i_imt, imt in enumerate(imtls.keys()):
+                for i_stat in range(n_stats):
+                    stats_im_hazard[i_vs30, i_site, i_imt, :, i_stat] = np.exp(
+                        np.interp(
+                            np.log(1 / hazard_rps),
+                            np.log(
+                                np.flip(hcurves_stats[i_vs30, i_site, i_imt, :, i_stat])
+                            ),
+                            np.log(np.flip(imtls[imt])),
+                        )
+                    )
+    return stats_im_hazard
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+@pytest.mark.parametrize("intensity_type", ["acc", "disp"])
+@pytest.mark.parametrize("site_chunk_size", [None, 1, 2])
+def test_calculate_hazard_design_intensities(
+    mini_hcurves_data, intensity_type, site_chunk_size
+):
+    hazard_rps = DEFAULT_RPS + [1, 10**9]  # include values outside the hazard curves
+
+    expected = calculate_hazard_design_intensities_loop(
+        mini_hcurves_data, hazard_rps, intensity_type
+    )
+    result = nshm_to_hdf5.calculate_hazard_design_intensities(
+        mini_hcurves_data, hazard_rps, intensity_type, site_chunk_size
+    )
+
+    assert result.shape == expected.shape
+    assert np.array_equal(result, expected, equal_nan=True)
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+def test_interpolate_along_last_axis_matches_np_interp():
+    rng = np.random.default_rng(42)
+    xp = np.sort(rng.random((20, 12)), axis=-1)
+    xp[:5, :4] = -np.inf  # e.g. log of zero probability
+    xp[5:10, 3:6] = xp[5:10, 3:4]  # repeated values
+    fp = np.log(np.sort(rng.random((20, 12)), axis=-1))
+    fp[10:, :] = -np.inf  # e.g. log of zero displacement
+    x = np.concatenate([[-1.0, 0.0, 2.0], xp[7, :], rng.random(10)])
+
+    result = nshm_to_hdf5.interpolate_along_last_axis(x, xp, fp)
+
+    for i in range(xp.shape[0]):
+        assert np.array_equal(result[i], np.interp(x, xp[i], fp[i]), equal_nan=True)
+
+
+@pytest.fixture
+def batch_sites():
+    latlons = [f"-4{i // 10}.{i % 10}00~17{i % 5}.500" for i in range(11)]
+    return pd.DataFrame({"latlon": latlons}, index=[f"site {i}" for i in range(11)])
+
+
+BATCH_QUERY = ([400, 750], ["PGA", "SA(1.0)"], ["mean", "0.9"], "NSHM_v99")
+
+
+@pytest.mark.parametrize("batch_size, workers", [(1, 1), (3, 1), (4, 3), (20, 2)])
+def test_retrieve_hazard_curves_in_batches(
+    tmp_path, fake_hazard_store, batch_sites, batch_size, workers
+):
+    expected = q_haz.retrieve_hazard_curves(batch_sites, *BATCH_QUERY)
+
+    checkpoint_file = tmp_path / "hcurves.checkpoint.hdf5"
+    hcurves, imtl_list = nshm_to_hdf5.retrieve_hazard_curves_in_batches(
+        checkpoint_file, batch_sites, *BATCH_QUERY, batch_size, workers
+    )
+
+    assert imtl_list == expected[1]
+    np.testing.assert_array_equal(hcurves, expected[0])
+    with h5py.File(checkpoint_file, "r") as hf:
+        assert hf["batch_done"][:].all()
+
+
+def test_retrieve_hazard_curves_in_batches_resumes(
+    tmp_path, fake_hazard_store, batch_sites
+):
+    expected, _ = q_haz.retrieve_hazard_curves(batch_sites, *BATCH_QUERY)
+    checkpoint_file = tmp_path / "hcurves.checkpoint.hdf5"
+
+    # the store fails during the batch with the last sites
+    fake_hazard_store.failing_locations = {batch_sites["latlon"].iloc[-1]}
+    with pytest.raises(ConnectionError):
+        nshm_to_hdf5.retrieve_hazard_curves_in_batches(
+            checkpoint_file, batch_sites, *BATCH_QUERY, batch_size=4
+        )
+    with h5py.File(checkpoint_file, "r") as hf:
+        assert hf["batch_done"][:].tolist() == [True, True, False]
+
+    # the rerun only queries the failed batch
+    fake_hazard_store.failing_locations = set()
+    fake_hazard_store.queried_locations = set()
+    hcurves, _ = nshm_to_hdf5.retrieve_hazard_curves_in_batches(
+        checkpoint_file, batch_sites, *BATCH_QUERY, batch_size=4
+    )
+
+    assert fake_hazard_store.queried_locations == set(batch_sites["latlon"].iloc[8:])
+    np.testing.assert_array_equal(hcurves, expected)
+
+
+def test_retrieve_hazard_curves_in_batches_restarts_changed_query(
+    tmp_path, fake_hazard_store, batch_sites
+):
+    checkpoint_file = tmp_path / "hcurves.checkpoint.hdf5"
+    nshm_to_hdf5.retrieve_hazard_curves_in_batches(
+        checkpoint_file, batch_sites.iloc[:5], *BATCH_QUERY, batch_size=4
+    )
+
+    fake_hazard_store.queried_locations = set()
+    hcurves, _ = nshm_to_hdf5.retrieve_hazard_curves_in_batches(
+        checkpoint_file, batch_sites, *BATCH_QUERY, batch_size=4
+    )
+
+    assert fake_hazard_store.queried_locations == set(batch_sites["latlon"])
+    assert hcurves.shape[1] == len(batch_sites)
+
+
+def test_query_NSHM_to_hdf5_in_batches(tmp_path, fake_hazard_store, batch_sites):
+    serial_file = tmp_path / "serial.hdf5"
+    batched_file = tmp_path / "batched.hdf5"
+
+    nshm_to_hdf5.query_NSHM_to_hdf5(serial_file, "NSHM_v99", batch_sites)
+    nshm_to_hdf5.query_NSHM_to_hdf5(
+        batched_file, "NSHM_v99", batch_sites, batch_size=4, workers=2
+    )
+
+    assert not nshm_to_hdf5.checkpoint_filepath(batched_file).exists()
+    with h5py.File(serial_file, "r") as serial, h5py.File(batched_file, "r") as batched:
+        for name in ["hcurves/hcurves_stats", "hazard_design/acc/stats_im_hazard"]:
+            np.testing.assert_array_equal(batched[name][:], serial[name][:])
+
+
+def test_retrieve_hazard_curves_in_batches_cached(
+    tmp_path, fake_hazard_store, batch_sites
+):
+    expected, _ = q_haz.retrieve_hazard_curves(batch_sites, *BATCH_QUERY)
+    cache = HazardCurveCache(tmp_path / "hcurve_cache.sqlite")
+
+    for run in range(2):
+        fake_hazard_store.queries = []
+        hcurves, _ = nshm_to_hdf5.retrieve_hazard_curves_in_batches(
+            tmp_path / f"run_{run}.checkpoint.hdf5",
+            batch_sites,
+            *BATCH_QUERY,
+            batch_size=3,
+            workers=3,
+            cache=cache,
+        )
+        np.testing.assert_array_equal(hcurves, expected)
+
+    assert fake_hazard_store.queries == []
+    assert cache.stats()["hits"] == cache.stats()["entries"]
+    cache.close()
@@ -0,0 +1,57 @@
+"""
+test the hazard curve retrieval in `nzssdt_2023.data_creation.query_NSHM`
+"""
+
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from nzssdt_2023.data_creation import query_NSHM
+
+VS30_LIST = [275, 400, 750]
+IMT_LIST = ["PGA", "SA(0.5)", "SA(1.0)"]
+AGG_LIST = ["mean", "0.9"]
+
+
+def test_retrieve_hazard_curves(fake_hazard_store):
+    sites = pd.DataFrame(
+        {
+            "latlon": [
+                "-36.852~174.763",
+                "-41.300~174.780",
+                "-43.531~172.637",
+                "-41.300~174.780",  # two sites at the same location
+            ]
+        },
+        index=["Auckland", "Wellington", "Christchurch", "Wellington CBD"],
+    )
+
+    hcurves, imtl_list = query_NSHM.retrieve_hazard_curves(
+        sites, VS30_LIST, IMT_LIST, AGG_LIST, "NSHM_v99"
+    )
+
+    assert imtl_list == fake_hazard_store.levels
+    assert hcurves.shape == (3, 4, 3, len(imtl_list), 2)
+    for (
+        (i_vs30, vs30),
+        (i_site, latlon),
+        (i_imt, imt),
+        (i_agg, agg),
+    ) in itertools.product(
+        enumerate(VS30_LIST),
+        enumerate(sites["latlon"]),
+        enumerate(IMT_LIST),
+        enumerate(AGG_LIST),
+    ):
+        np.testing.assert_array_equal(
+            hcurves[i_vs30, i_site, i_imt, :, i_agg],
+            fake_hazard_store.curve_values(latlon, vs30, imt, agg),
+        )
+
+
+def test_index_maps():
+    assert query_NSHM.first_index_map(["a", "b", "a", "c"]) == {"a": 0, "b": 1, "c": 3}
+
+    sites = pd.DataFrame({"latlon": ["x", "y", "x"]})
+    assert query_NSHM.site_index_map(sites) == {"x": [0, 2], "y": [1]}
@@ -2,6 +2,7 @@
 test the pga functions in `nzssdt_2023.data_creation.sa_parameter_generation`
 """
 
+import numpy as np
 import pytest
 
 import nzssdt_2023.data_creation.sa_parameter_generation as sa_gen
@@ -48,3 +49,23 @@ def test_create_sa_table(mini_hcurves_hdf5_path, pga_reduced_rp_2500):
     assert pytest.approx(round(float(akl["Site Class IV"]), 2)) == float(
         df0[("APoE: 1/2500", "Site Class IV", "PGA")]["Auckland"]
     )
+
+
+@pytest.mark.parametrize("workers", [2, 3, 8])
+def test_calculate_mean_parameter_arrays_sharded(mini_hcurves_hdf5_path, workers):
+    n_sites = len(sa_gen.extract_sites(mini_hcurves_hdf5_path))
+    _, hazard_rp_list = sa_gen.extract_APoEs(mini_hcurves_hdf5_path)
+    args = (mini_hcurves_hdf5_path, n_sites, sa_gen.VS30_LIST, hazard_rp_list)
+
+    serial = sa_gen.calculate_mean_parameter_arrays(*args)
+    sharded = sa_gen.calculate_mean_parameter_arrays(*args, workers=workers)
+
+    for expected, actual in zip(serial, sharded):
+        np.testing.assert_array_equal(actual, expected)
+
+
+def test_create_sa_table_workers(mini_hcurves_hdf5_path):
+    serial = sa_gen.create_sa_table(mini_hcurves_hdf5_path)
+    sharded = sa_gen.create_sa_table(mini_hcurves_hdf5_path, workers=2)
+
+    assert sharded.to_json() == serial.to_json()
@@ -396,3 +396,74 @@ def test_Td_fit_error_exploratory():
     result = sa_gen.Td_fit_error(td, relevant_periods, relevant_spectrum, pga, sas, tc)
 
     assert pytest.approx(result) == 0.013511859172484967
+
+
+@pytest.mark.parametrize("inclusive", [False, True])
+def test_relevant_domain_indices_vectorized(inclusive):
+    periods = np.arange(0, 10.1, 0.1)
+    tcs = np.array([0.25, 0.3, 0.66, 0.75, 0.8, 1.2], dtype=np.float32)
+
+    min_idx, max_idx = sa_gen.relevant_domain_indices(periods, tcs, inclusive)
+
+    for tc, i_min in zip(tcs, min_idx):
+        assert (i_min, max_idx) == sa_gen.relevant_domain_indices(
+            periods, tc, inclusive
+        )
+
+
+def test_fit_Td_spectra_matches_fit_Td():
+    rng = np.random.default_rng(2)
+    n_spectra = 200
+    periods = np.arange(0, 10.1, 0.1)
+    spectra = np.abs(rng.normal(1, 0.5, (n_spectra, len(periods)))) * np.exp(
+        -periods / rng.uniform(0.5, 4, (n_spectra, 1))
+    )
+    spectra[:50] = np.round(spectra[:50], 1)  # encourage ties in the error terms
+    sas = np.round(rng.uniform(0.05, 3, n_spectra), 2).astype(np.float32)
+    tc = sa_gen.sig_figs(rng.uniform(0.1, 1.5, n_spectra), 2).astype(np.float32)
+    pga = 0.5 * sas
+
+    result = sa_gen.fit_Td_spectra(spectra.reshape(4, 50, -1), periods, pga, sas, tc)
+
+    assert result.shape == (4, 50)
+    expected = [
+        sa_gen.fit_Td(spectrum, periods, pga[i], sas[i], tc[i])
+        for i, spectrum in enumerate(spectra)
+    ]
+    assert result.ravel().tolist() == expected
+
+
+@pytest.mark.parametrize("dt", [0.1, 0.05, 0.33])
+def test_interpolate_spectra_matches_np_interp(mini_hcurves_hdf5_path, dt):
+    acc_spectra, imtls = sa_gen.extract_spectra(mini_hcurves_hdf5_path)
+    period_list = [sa_gen.period_from_imt(imt) for imt in imtls.keys()]
+
+    new_spectra, new_period_list = sa_gen.interpolate_spectra(acc_spectra, imtls, dt)
+
+    n_vs30s, n_sites, _, n_apoes, n_stats = acc_spectra.shape
+    assert new_spectra.shape == (
+        n_vs30s,
+        n_sites,
+        len(new_period_list),
+        n_apoes,
+        n_stats,
+    )
+    for idx in np.ndindex(n_vs30s, n_sites):
+        for i_apoe, i_stat in np.ndindex(n_apoes, n_stats):
+            assert np.array_equal(
+                new_spectra[idx][:, i_apoe, i_stat],
+                np.interp(
+                    new_period_list, period_list, acc_spectra[idx][:, i_apoe, i_stat]
+                ),
+            )
+
+
+def test_interpolate_spectra_selected_stats(mini_hcurves_hdf5_path):
+    acc_spectra, imtls = sa_gen.extract_spectra(mini_hcurves_hdf5_path)
+
+    all_spectra, periods = sa_gen.interpolate_spectra(acc_spectra, imtls)
+    p90_spectra, p90_periods = sa_gen.interpolate_spectra(acc_spectra, imtls, stats=[1])
+
+    assert p90_spectra.shape[-1] == 1
+    assert np.array_equal(periods, p90_periods)
+    assert np.array_equal(p90_spectra[..., 0], all_spectra[..., 1])
@@ -69,3 +69,44 @@ def test_reduce_PGAs(mini_hcurves_hdf5_path):
     assert (
         reduced_PGA <= PGA
     ).all(), "reduced PGA should not exceed the original value"
+
+
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+@pytest.mark.parametrize("site_class", constants.PGA_REDUCTIONS.keys())
+def test_calc_reduced_PGA_array_matches_scalar(site_class, dtype):
+    threshold = dtype(constants.PGA_REDUCTIONS[site_class].PGA_threshold)
+    pgas = np.array(
+        [
+            0.0,
+            np.nextafter(threshold, dtype(0)),
+            threshold,
+            constants.PGA_REDUCTIONS[site_class].PGA_threshold,
+            np.nextafter(threshold, dtype(1)),
+            0.5,
+            1.0,
+            2.5,
+        ],
+        dtype=dtype,
+    )
+
+    result = sa_gen.calc_reduced_PGA(pgas, site_class)
+
+    assert result.tolist() == [sa_gen.calc_reduced_PGA(pga, site_class) for pga in pgas]
+
+
+def test_reduce_PGAs_matches_scalar(mini_hcurves_hdf5_path):
+    acc_spectra, imtls = sa_gen.extract_spectra(mini_hcurves_hdf5_path)
+    PGA = acc_spectra[:, :, constants.IMT_LIST.index("PGA"), :, :]
+
+    reduced_PGA = sa_gen.reduce_PGAs(PGA)
+
+    expected = PGA.copy()
+    for sc in constants.PGA_REDUCTIONS.keys():
+        i_vs30 = constants.VS30_LIST.index(
+            constants.SITE_CLASSES[sc].representative_vs30
+        )
+        for idx in np.ndindex(PGA[i_vs30].shape):
+            expected[i_vs30][idx] = sa_gen.calc_reduced_PGA(PGA[i_vs30][idx], sc)
+
+    assert reduced_PGA.dtype == PGA.dtype
+    assert np.array_equal(reduced_PGA, expected)
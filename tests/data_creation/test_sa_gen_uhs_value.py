@@ -83,3 +83,29 @@ def test_uhs_value_numpy(args, expected):
     ]
     print(res)
     assert res[0] == expected
+
+
+def test_uhs_values_matches_uhs_value():
+    args = [param.values[0] for param in UHS_EXPECTED]
+    expected = [param.values[1] for param in UHS_EXPECTED]
+
+    # one array per argument, i.e. (periods, PGA, Sas, Tc, Td)
+    result = sa_gen.uhs_values(*(np.array(values) for values in zip(*args)))
+
+    assert result.tolist() == expected
+
+
+def test_uhs_values_broadcasting():
+    periods = np.array([0, 0.05, 0.5, 1.0, 3.0])
+    PGA = np.array([[0.5], [1.0]])
+    Sas = np.array([[1.0], [2.0]])
+    Tc, Td = 0.6, 2.0
+
+    result = sa_gen.uhs_values(periods, PGA, Sas, Tc, Td)
+
+    assert result.shape == (2, 5)
+    for i in range(2):
+        for j, period in enumerate(periods):
+            assert result[i, j] == sa_gen.uhs_value(
+                period, PGA[i, 0], Sas[i, 0], Tc, Td
+            )
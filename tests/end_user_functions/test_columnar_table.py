@@ -0,0 +1,57 @@
+"""
+columnar parameter tables
+
+- functions in `end_user_functions.columnar_table` and the .npz preference of `.constants`
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import nzssdt_2023.end_user_functions.constants as constants
+from nzssdt_2023.end_user_functions.columnar_table import (
+    load_columnar_table,
+    save_columnar_table,
+)
+
+FIXTURES = Path(__file__).parent.parent / "fixtures" / "v2_json"
+
+
+@pytest.mark.parametrize(
+    "json_name",
+    ["first_10_named_locations_combo.json", "first_10_grid_locations_combo.json"],
+)
+def test_columnar_round_trip(json_name, tmp_path):
+
+    table = pd.read_json(FIXTURES / json_name, orient="table", precise_float=True)
+
+    save_columnar_table(table, tmp_path / "table.npz")
+    loaded = load_columnar_table(tmp_path / "table.npz")
+
+    pd.testing.assert_frame_equal(loaded, table)
+
+
+def test_columnar_format_version(tmp_path):
+
+    np.savez(tmp_path / "table.npz", format_version=2, columns=np.array(["x"]))
+
+    with pytest.raises(ValueError):
+        load_columnar_table(tmp_path / "table.npz")
+
+
+def test_read_parameter_table_prefers_npz(tmp_path, mocker):
+
+    json_path = FIXTURES / "first_10_named_locations_combo.json"
+    npz_path = tmp_path / "table.npz"
+    read_json = mocker.spy(pd, "read_json")
+
+    table = constants.read_parameter_table(json_path, npz_path)
+    assert read_json.call_count == 1
+
+    save_columnar_table(table, npz_path)
+    pd.testing.assert_frame_equal(
+        constants.read_parameter_table(json_path, npz_path), table
+    )
+    assert read_json.call_count == 1
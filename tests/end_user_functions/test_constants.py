@@ -0,0 +1,38 @@
+"""
+lazy loading of the end user tables and geometries
+
+- functions in `end_user_functions.constants`
+"""
+
+import importlib
+
+import geopandas as gpd
+import pandas as pd
+
+import nzssdt_2023.end_user_functions.constants as constants
+
+
+def test_import_reads_no_data(mocker):
+
+    read_json = mocker.spy(pd, "read_json")
+    read_file = mocker.spy(gpd, "read_file")
+
+    importlib.reload(constants)
+
+    assert read_json.call_count == 0
+    assert read_file.call_count == 0
+
+
+def test_accessors_are_cached(mocker):
+
+    importlib.reload(constants)
+    read_file = mocker.spy(gpd, "read_file")
+
+    grid_points = constants.get_grid_points()
+    assert constants.get_grid_points() is grid_points
+    assert grid_points.index.name == "Name"
+
+    # the former module constants use the same accessors
+    assert constants.GRID_PTS is grid_points
+    assert constants.FAULTS is constants.get_faults()
+    assert read_file.call_count == 2
@@ -4,13 +4,27 @@ tests for creating TS spectra from TS parameters
 - functions in `end_user_functions.create_spectra`
 """
 
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
 import pytest
 
+import nzssdt_2023.end_user_functions.create_spectra as create_spectra
+from nzssdt_2023.data_creation.sa_parameter_generation import uhs_values
 from nzssdt_2023.end_user_functions.create_spectra import (
+    SPECTRUM_CACHE,
+    SpectrumCache,
     create_enveloped_spectra,
+    create_spectra_many,
     create_spectrum_from_parameters,
+    load_spectra_table,
+    lookup_spectra,
+    save_spectra_table,
 )
 
+FIXTURES = Path(__file__).parent.parent / "fixtures"
+
 
 @pytest.mark.parametrize(
     "pga, sas, tc, td, periods, expected_spectrum",
@@ -47,3 +61,148 @@ def test_create_enveloped_spectra(
     ].to_list()
 
     assert expected_envelope == envelope
+
+
+def test_create_spectra_many():
+
+    periods = [0, 0.5, 1, 1.5, 2]
+    site_class_list = ["III", "IV"]
+    spectra, envelopes = create_spectra_many(
+        ["Wellington", "Auckland", "Wellington"],
+        [500, 100, 25],
+        site_class_list,
+        periods,
+    )
+
+    assert spectra.shape == (3, 2, 5)
+    assert envelopes.shape == (3, 5)
+    assert envelopes[0].tolist() == [0.91, 1.84, 1.129, 0.752, 0.564]
+    np.testing.assert_array_equal(envelopes, spectra.max(axis=1))
+
+    for i, (location_id, apoe_n) in enumerate([("Auckland", 100), ("Wellington", 25)]):
+        df = create_enveloped_spectra(location_id, apoe_n, site_class_list, periods)
+        np.testing.assert_array_equal(spectra[i + 1].T, df[site_class_list])
+        np.testing.assert_array_equal(envelopes[i + 1], df["Envelope"])
+
+
+def test_spectrum_cache():
+
+    periods = [0, 0.5, 1, 1.5, 2]
+    parameters = [(0.91, 1.84, 0.52, 2.0), (0.77, 1.71, 0.66, 2.6)]
+    cache = SpectrumCache(maxsize=2)
+
+    spectra = cache.spectra(parameters, periods, 3)
+    expected = [uhs_values(periods, *p).round(3) for p in parameters]
+    np.testing.assert_array_equal(spectra, expected)
+    assert not spectra.flags.writeable
+    assert cache.stats() == {
+        "hits": 0,
+        "misses": 2,
+        "entries": 2,
+        "maxsize": 2,
+        "hit_rate": 0.0,
+    }
+
+    # a repeated spectrum is a hit, another period grid or precision is a miss
+    np.testing.assert_array_equal(
+        cache.spectra(parameters[1:], periods, 3), expected[1:]
+    )
+    cache.spectra(parameters[1:], periods[:-1], 3)
+    cache.spectra(parameters[1:], periods, 2)
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 4
+    assert cache.stats()["entries"] == 2
+
+    cache.clear()
+    assert cache.stats()["entries"] == 0
+
+
+def test_create_spectrum_is_cached():
+
+    SPECTRUM_CACHE.clear()
+    first = create_spectrum_from_parameters(0.77, 1.71, 0.66, 2.6)
+    second = create_spectrum_from_parameters(0.77, 1.71, 0.66, 2.6)
+
+    assert first == second
+    assert SPECTRUM_CACHE.stats()["hits"] == 1
+    assert SPECTRUM_CACHE.stats()["misses"] == 1
+
+
+def test_spectra_table(tmp_path):
+
+    table = pd.read_json(
+        FIXTURES / "v2_json" / "first_10_named_locations_combo.json",
+        orient="table",
+        precise_float=True,
+    )
+    path = tmp_path / "spectra.npz"
+    save_spectra_table(table, path, periods=[0, 0.5, 1, 1.5, 2])
+    spectra_table = load_spectra_table(path)
+
+    keys = table[["Location", "APoE (1/n)", "Site Class"]].drop_duplicates()
+    assert len(spectra_table.keys) == len(keys)
+    assert spectra_table.spectra.dtype == np.float32
+    assert len(spectra_table.spectra) <= len(keys)
+
+    # the looked up spectra are the spectra of the parameters
+    location_id, apoe_n, site_class = keys.iloc[-1]
+    spectra = lookup_spectra(
+        spectra_table, location_id, apoe_n, [site_class], [0, 0.5, 1, 1.5, 2], 3
+    )
+    parameters = table.set_index(["Location", "APoE (1/n)", "Site Class"]).loc[
+        (location_id, apoe_n, site_class), ["PGA", "Sas", "Tc", "Td"]
+    ]
+    expected = uhs_values([0, 0.5, 1, 1.5, 2], *parameters).round(3)
+    np.testing.assert_array_equal(spectra, [expected])
+
+    # another period grid, precision, or a missing key is not looked up
+    assert (
+        lookup_spectra(spectra_table, location_id, apoe_n, [site_class], [0], 3) is None
+    )
+    assert (
+        lookup_spectra(
+            spectra_table, location_id, apoe_n, [site_class], [0, 0.5, 1, 1.5, 2], 2
+        )
+        is None
+    )
+    assert (
+        lookup_spectra(spectra_table, "Atlantis", 25, ["IV"], [0, 0.5, 1, 1.5, 2], 3)
+        is None
+    )
+
+
+def test_create_spectra_many_uses_spectra_table(tmp_path, monkeypatch):
+
+    table = pd.read_json(
+        FIXTURES / "v2_json" / "first_10_named_locations_combo.json",
+        orient="table",
+        precise_float=True,
+    )
+    periods = [0, 0.5, 1, 1.5, 2]
+    path = tmp_path / "spectra.npz"
+    save_spectra_table(table, path, periods)
+    monkeypatch.setattr(
+        create_spectra, "get_spectra_table", lambda: load_spectra_table(path)
+    )
+    monkeypatch.setattr(
+        create_spectra,
+        "retrieve_sa_parameters_many",
+        lambda *args: pytest.fail("the parameters should not be retrieved"),
+    )
+
+    keys = table[["Location", "APoE (1/n)"]].drop_duplicates().iloc[[0, -1]]
+    site_class_list = ["II", "V"]
+    spectra, envelopes = create_spectra_many(
+        keys["Location"].tolist(), keys["APoE (1/n)"].tolist(), site_class_list, periods
+    )
+
+    indexed = table.set_index(["Location", "APoE (1/n)", "Site Class"])
+    for i, (location_id, apoe_n) in enumerate(keys.itertuples(index=False)):
+        for j, site_class in enumerate(site_class_list):
+            parameters = indexed.loc[
+                (location_id, apoe_n, site_class), ["PGA", "Sas", "Tc", "Td"]
+            ]
+            expected = uhs_values(periods, *parameters).round(3)
+            np.testing.assert_array_equal(spectra[i, j], expected)
+    np.testing.assert_array_equal(envelopes, spectra.max(axis=1))
+    assert not spectra.flags.writeable
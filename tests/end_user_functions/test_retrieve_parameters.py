@@ -10,12 +10,15 @@ import pytest
 
 from nzssdt_2023.end_user_functions.geospatial_analysis import (
     calculate_distance_to_fault,
+    calculate_distances_to_fault,
     identify_location_id,
+    identify_location_ids,
 )
 from nzssdt_2023.end_user_functions.query_parameters import (
     parameters_by_location_id,
     retrieve_md_parameters,
     retrieve_sa_parameters,
+    retrieve_sa_parameters_many,
 )
 
 
@@ -33,6 +36,24 @@ def test_retrieve_sa_parameters(location_id, apoe_n, site_class, expected_parame
     )
 
 
+def test_retrieve_sa_parameters_many():
+
+    parameters = retrieve_sa_parameters_many(
+        ["Wellington", "Auckland"], [500, 100], ["IV", "II"]
+    )
+    np.testing.assert_array_equal(
+        parameters, [(0.77, 1.71, 0.66, 2.6), (0.06, 0.12, 0.45, 2.4)]
+    )
+
+    # arguments are broadcast
+    parameters = retrieve_sa_parameters_many("Wellington", [[100], [500]], ["II", "IV"])
+    assert parameters.shape == (2, 2, 4)
+    assert tuple(parameters[1, 1]) == retrieve_sa_parameters("Wellington", 500, "IV")
+
+    with pytest.raises(KeyError):
+        retrieve_sa_parameters_many(["Wellington", "Nowhere"], 500, "IV")
+
+
 @pytest.mark.parametrize(
     "location_id, apoe_n, site_class, expected_parameters",
     [
@@ -73,6 +94,21 @@ def test_identify_location_id(latlon, expected_location_id):
     assert expected_location_id == identify_location_id(longitude, latitude)
 
 
+def test_identify_location_ids():
+
+    latitudes = [-41.25, -41.25, -41.35, -41.25, -41.21]
+    longitudes = [174.775, 174.65, 174.65, 174.775, 174.64]
+
+    assert identify_location_ids(longitudes, latitudes) == [
+        "Wellington",
+        "-41.2~174.6",
+        "outside NZ",
+        "Wellington",
+        "-41.2~174.6",
+    ]
+    assert identify_location_ids([], []) == []
+
+
 @pytest.mark.parametrize(
     "latlon, expected_d",
     [
@@ -85,3 +121,17 @@ def test_distance_to_fault(latlon, expected_d):
     latitude, longitude = latlon
 
     assert expected_d == calculate_distance_to_fault(longitude, latitude)
+
+
+def test_distances_to_fault():
+
+    latitudes = [-41.25, -41.32, -41.25]
+    longitudes = [174.65, 174.65, 174.65]
+
+    d = calculate_distances_to_fault(longitudes, latitudes)
+
+    np.testing.assert_array_equal(d, [10, 5, 10])
+    assert list(d) == [
+        calculate_distance_to_fault(longitude, latitude)
+        for longitude, latitude in zip(longitudes, latitudes)
+    ]
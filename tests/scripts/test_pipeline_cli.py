@@ -109,6 +109,86 @@ def test_02_hazard(mocker, options):
         assert "init resource for version_id: MY_NEW_ONE" in result.output
 
 
+@pytest.mark.parametrize(
+    "options", [None, "--batch-size 100 --workers 4", "--no-curve-cache"]
+)
+def test_02_hazard_options(mocker, options):
+    mocker.patch.object(version_cli, "get_site_list", return_value=["site1"])
+    mock_get_hazard_curves = mocker.patch.object(version_cli, "get_hazard_curves")
+
+    runner = CliRunner()
+    cmdline = ["02-hazard", "NSHM_v99"]
+    if options:
+        cmdline += options.split(" ")
+    result = runner.invoke(cli, cmdline)
+
+    print(result.output)
+    assert result.exit_code == 0
+
+    mock_get_hazard_curves.assert_called_once_with(
+        site_list=["site1"],
+        site_limit=0,
+        hazard_id="NSHM_v99",
+        batch_size=100 if options and "--batch-size" in options else 0,
+        workers=4 if options and "--workers" in options else 1,
+        curve_cache=not (options and "--no-curve-cache" in options),
+    )
+
+
+def test_prune_cache(mocker):
+    mock_prune = mocker.patch.object(version_cli, "prune_hcurve_cache", return_value=42)
+
+    runner = CliRunner()
+    result = runner.invoke(cli, ["prune-cache", "NSHM_v99"])
+
+    assert result.exit_code == 0
+    mock_prune.assert_called_once_with("NSHM_v99")
+    assert "removed 42 hazard curves of NSHM_v99" in result.output
+
+
+@pytest.mark.parametrize("options", [None, "--workers 4"])
+def test_03_tables(mocker, options):
+    mock_create_parameter_tables = mocker.patch.object(
+        version_cli, "create_parameter_tables"
+    )
+
+    runner = CliRunner()
+    cmdline = ["03-tables", "MY_NEW_ONE", "NSHM_v99"]
+    if options:
+        cmdline += options.split(" ")
+    result = runner.invoke(cli, cmdline)
+
+    print(result.output)
+    assert result.exit_code == 0
+
+    mock_create_parameter_tables.assert_called_once_with(
+        version="MY_NEW_ONE",
+        hazard_id="NSHM_v99",
+        site_limit=0,
+        no_cache=False,
+        overwrite_json=True,
+        workers=4 if options else 1,
+    )
+
+
+@pytest.mark.parametrize("options", [None, "--spectra-table"])
+def test_07_deliverables(mocker, options):
+    mock_create_deliverables = mocker.patch.object(version_cli, "create_deliverables")
+
+    runner = CliRunner()
+    cmdline = ["07-deliverables", "MY_NEW_ONE"]
+    if options:
+        cmdline += options.split(" ")
+    result = runner.invoke(cli, cmdline)
+
+    print(result.output)
+    assert result.exit_code == 0
+
+    mock_create_deliverables.assert_called_once_with(
+        "MY_NEW_ONE", overwrite=True, spectra_table=options is not None
+    )
+
+
 def test_info(mocker):
     version_manager = version_cli.version_manager
     # patch the underlying functions
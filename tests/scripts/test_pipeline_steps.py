@@ -24,13 +24,29 @@ def test_get_site_list():
     assert akl.lon == "174.763"
 
 
-def test_get_hazard_curves():
+def test_get_hazard_curves(monkeypatch, tmp_path):
     # Mocking the query_NSHM_to_hdf5 function
-    def mock_query_NSHM_to_hdf5(hf_path, hazard_id, site_list, site_limit):
-        pass
-
-    pipeline_steps.query_NSHM_to_hdf5 = mock_query_NSHM_to_hdf5
+    caches = []
+
+    def mock_query_NSHM_to_hdf5(
+        hf_path, hazard_id, site_list, site_limit, batch_size, workers, cache
+    ):
+        caches.append(cache)
+
+    monkeypatch.setattr(pipeline_steps, "query_NSHM_to_hdf5", mock_query_NSHM_to_hdf5)
+    # keep the hazard curve cache out of the WORKING_FOLDER
+    monkeypatch.setattr(
+        pipeline_steps,
+        "hcurve_cache_filepath",
+        lambda: tmp_path / "hcurve_cache.sqlite",
+    )
     pipeline_steps.get_hazard_curves(site_list=["site1"], site_limit=2)
+    pipeline_steps.get_hazard_curves(
+        site_list=["site1"], site_limit=2, curve_cache=False
+    )
+
+    assert caches[0].db_path == tmp_path / "hcurve_cache.sqlite"
+    assert caches[1] is None
 
 
 def test_get_resources_version_path():